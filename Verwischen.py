@@ -1,202 +1,1039 @@
 #!/usr/bin/env python3
 
 import configparser
+import copy
+import csv
 import random
 import ast
 import time
 import os
+import bisect
+import functools
+import itertools
+import atexit
+import json
+import math
+import operator
+import pickle
+import struct
+import sys
+import threading
+from collections import OrderedDict, deque
+from array import array
+
+try:
+	import numpy
+except ImportError:
+	# numpy is optional, batch lookups then fall back to bisection
+	numpy = None
+
+
+
+class Config:
+	'''
+	Configurable parameters of an anonymizer session (EDITABLE IN config.ini)
+	'''
 
-##! Configurable Parameter (EDITABLE IN config.ini)
-
-# quasi-identifier data position(s) in the inputs. must be integer indicating position (starting from 0)
-QI_POS = [1, 2]
-
-# identifier data position(s) in the inputs. must be integer indicating position (starting from 0)
-ID_POS = [3, 4]
+	def __init__(self):
+		# quasi-identifier data position(s) in the inputs. must be integer indicating position (starting from 0)
+		self.QI_POS = [1, 2]
 
-# basic range for generalizing
-GENERALIZE_RANGE = 5
+		# identifier data position(s) in the inputs. must be integer indicating position (starting from 0)
+		self.ID_POS = [3, 4]
 
-# accumulation delay allowed (integer, multiplier of incoming tuple frequency)
-ACCUMULATION_DELAY_TOLERANCE = 5
+		# basic range for generalizing
+		self.GENERALIZE_RANGE = 5
 
-# Timer for force flushing all ECs and start over by scratch (avoid overfitting)
-REFRESH_TIMER = 3600
+		# accumulation delay allowed (integer, multiplier of incoming tuple frequency)
+		self.ACCUMULATION_DELAY_TOLERANCE = 5
 
-# k-anonymity k
-THRESHOLD_K = 5
+		# Timer for force flushing all ECs and start over by scratch (avoid overfitting)
+		self.REFRESH_TIMER = 3600
 
-# maximum members (records) allowed to covered by a single EC. All ECs will be wiped and refreshed when any EC reached this limit.
-EC_MAX_HOLDING_MEMBERS = 100
+		# k-anonymity k
+		self.THRESHOLD_K = 5
 
-# the minimum frequency of body sensor routine (how fast may tuple arrive)
-SENSOR_FREQUENCY = 1
+		# maximum members (records) allowed to covered by a single EC. All ECs will be wiped and refreshed when any EC reached this limit.
+		self.EC_MAX_HOLDING_MEMBERS = 100
 
+		# the minimum frequency of body sensor routine (how fast may tuple arrive)
+		self.SENSOR_FREQUENCY = 1
 
-##! Internally Used Variables (DO NOT alter)
+		# fraction of deprecated ECs in a QI above which they are compacted away (1: never)
+		self.COMPACTION_THRESHOLD = 0.5
 
-# EC_list : 2 dimensional list of dict
-EC_list = []
+		# tuples a new EC generation of a QI warms up on before replacing the current one (0: wipe all ECs at once on refresh)
+		self.REFRESH_WARMUP = 0
 
-# the list storing accumulated tuples
-# [counter, original value, QI_EC_indicator]
-Accumulated_list = []
+		# optional names of the input columns (by position), which QI_POS and ID_POS may then refer to
+		self.COLUMNS = None
 
-# dictionary for storing the compromised range for essential publication
-Compromised_range_dict = {}
+		# bounded memory: most tuples accumulated at once, the oldest ones beyond are published right away (0: unbounded)
+		self.MAX_ACCUMULATED = 0
 
-# dictionary for recording EC change during expiring tuple resolution process
-EC_alter_log = {}
+		# bounded memory: most live ECs per QI, the adjacent ECs holding the fewest members are merged beyond (0: unbounded)
+		self.MAX_LIVE_ECS = 0
 
-# The timer for EC refreshing
-Init_timer = 0
 
-# DoS detection
-Last_arrival_time = 0
+def _column_positions(elements, columns):
+	'''
+	Check a list of column positions of config.ini, resolving column names against COLUMNS
+	'''
 
-# For research paper use only
-EXPERIMENT_MODE = False
+	# check if the interpreted data is a list
+	if not isinstance(elements, list):
+		raise SyntaxError
 
+	positions = []
+	for element in elements:
+		if isinstance(element, str) and columns is not None:
+			# raises ValueError on unknown names
+			element = columns.index(element)
+		if not isinstance(element, int):
+			raise SyntaxError
+		elif element < 0:
+			raise SyntaxError
+		positions.append(element)
+	return positions
 
 
-def read_config():
+def load_config(path="config.ini"):
 	'''
 	Load the configuration from config.ini
 	'''
 
-	global QI_POS, ID_POS, GENERALIZE_RANGE, ACCUMULATION_DELAY_TOLERANCE, REFRESH_TIMER, THRESHOLD_K, EC_MAX_HOLDING_MEMBERS, SENSOR_FREQUENCY
+	cfg = Config()
 
 	# try-catch block for reading config file
 	try:
 		conf = configparser.ConfigParser()
-		conf.read('config.ini')
+		conf.read(path)
 		
-		QI_POS = ast.literal_eval(conf['params']['QI_POS'])		
-		# check if the interpreted data is a list
-		if not isinstance(QI_POS, list):
-			raise SyntaxError
-		for element in QI_POS:
-			if not isinstance(element, int):
-				raise SyntaxError
-			elif element < 0:
+		if 'COLUMNS' in conf['params']:
+			cfg.COLUMNS = ast.literal_eval(conf['params']['COLUMNS'])
+			# check if the interpreted data is a list of distinct names
+			if not isinstance(cfg.COLUMNS, list) or len(set(cfg.COLUMNS)) != len(cfg.COLUMNS):
 				raise SyntaxError
+			for element in cfg.COLUMNS:
+				if not isinstance(element, str):
+					raise SyntaxError
 
-		ID_POS = ast.literal_eval(conf['params']['ID_POS'])		
-		# check if the interpreted data is a list
-		if not isinstance(ID_POS, list):
-			raise SyntaxError
-		for element in ID_POS:
-			if not isinstance(element, int):
-				raise SyntaxError
-			elif element < 0:
-				raise SyntaxError
+		cfg.QI_POS = _column_positions(ast.literal_eval(conf['params']['QI_POS']), cfg.COLUMNS)
+		cfg.ID_POS = _column_positions(ast.literal_eval(conf['params']['ID_POS']), cfg.COLUMNS)
 
-		GENERALIZE_RANGE = float(conf['params']['GENERALIZE_RANGE'])
-		ACCUMULATION_DELAY_TOLERANCE = int(conf['params']['ACCUMULATION_DELAY_TOLERANCE'])
-		REFRESH_TIMER = float(conf['params']['REFRESH_TIMER'])
-		THRESHOLD_K = int(conf['params']['THRESHOLD_K'])
-		EC_MAX_HOLDING_MEMBERS = int(conf['params']['EC_MAX_HOLDING_MEMBERS'])
-		SENSOR_FREQUENCY = float(conf['params']['SENSOR_FREQUENCY'])
+		cfg.GENERALIZE_RANGE = float(conf['params']['GENERALIZE_RANGE'])
+		cfg.ACCUMULATION_DELAY_TOLERANCE = int(conf['params']['ACCUMULATION_DELAY_TOLERANCE'])
+		cfg.REFRESH_TIMER = float(conf['params']['REFRESH_TIMER'])
+		cfg.THRESHOLD_K = int(conf['params']['THRESHOLD_K'])
+		cfg.EC_MAX_HOLDING_MEMBERS = int(conf['params']['EC_MAX_HOLDING_MEMBERS'])
+		cfg.SENSOR_FREQUENCY = float(conf['params']['SENSOR_FREQUENCY'])
+
+		# optional parameters
+		cfg.COMPACTION_THRESHOLD = float(conf['params'].get('COMPACTION_THRESHOLD', cfg.COMPACTION_THRESHOLD))
+		cfg.REFRESH_WARMUP = int(conf['params'].get('REFRESH_WARMUP', cfg.REFRESH_WARMUP))
+		cfg.MAX_ACCUMULATED = int(conf['params'].get('MAX_ACCUMULATED', cfg.MAX_ACCUMULATED))
+		cfg.MAX_LIVE_ECS = int(conf['params'].get('MAX_LIVE_ECS', cfg.MAX_LIVE_ECS))
 
 		# positive value check
-		if GENERALIZE_RANGE < 0 or ACCUMULATION_DELAY_TOLERANCE < 0 or REFRESH_TIMER < 0 or THRESHOLD_K < 0 or EC_MAX_HOLDING_MEMBERS < 0 or SENSOR_FREQUENCY < 0:
+		if cfg.GENERALIZE_RANGE < 0 or cfg.ACCUMULATION_DELAY_TOLERANCE < 0 or cfg.REFRESH_TIMER < 0 or cfg.THRESHOLD_K < 0 or cfg.EC_MAX_HOLDING_MEMBERS < 0 or cfg.SENSOR_FREQUENCY < 0:
+			raise SyntaxError
+		if not 0 <= cfg.COMPACTION_THRESHOLD <= 1 or cfg.REFRESH_WARMUP < 0:
+			raise SyntaxError
+		if cfg.MAX_ACCUMULATED < 0 or cfg.MAX_LIVE_ECS < 0:
 			raise SyntaxError
 
 	except Exception:
 		raise Exception("Error: Invalid configuration parameters detected.")
-	
 
-def initialize():
+	return cfg
+
+
+
+class ECStore:
 	'''
-	Initialize global variables
+	Equivalence classes of one QI, stored column-wise in compact arrays (an EC is identified by its position, the "number")
+	Also keeps a bound-sorted index over the live (non-deprecated) ECs. Live ECs never overlap,
+	so ordering them by lower bound also orders them by upper bound
+	A second index holds the mature live ECs, those with at least mature_members members
+	'''
+
+	__slots__ = ("lbound", "ubound", "member", "deprecated", "lbounds", "numbers", "mature_members", "mature_lbounds", "mature_numbers", "peak")
+
+	def __init__(self, mature_members=1):
+		# EC columns, indexed by EC number
+		self.lbound = array('d')
+		self.ubound = array('d')
+		self.member = array('i')
+		self.deprecated = bytearray()
+
+		# lower bounds of the live ECs in ascending order
+		self.lbounds = array('d')
+		# EC numbers aligned with self.lbounds
+		self.numbers = array('i')
+
+		# the same for the mature live ECs
+		self.mature_members = mature_members
+		self.mature_lbounds = array('d')
+		self.mature_numbers = array('i')
+
+		# largest member count held by any EC (deprecated ones included), members never leave an EC
+		self.peak = 0
+
+	def __len__(self):
+		return len(self.member)
+
+	def __repr__(self):
+		# same layout as the former list of EC dicts
+		return repr([{
+			'number': n,
+			'member': self.member[n],
+			'lbound': self.lbound[n],
+			'ubound': self.ubound[n],
+			'deprecated': bool(self.deprecated[n])
+		} for n in range(len(self.member))])
+
+	def _position(self, ecn, lbounds, numbers):
+		# locate an indexed EC by its current lower bound
+		pos = bisect.bisect_left(lbounds, self.lbound[ecn])
+		while numbers[pos] != ecn:
+			pos += 1
+		return pos
+
+	def _insert(self, ecn):
+		lb = self.lbound[ecn]
+		pos = bisect.bisect_right(self.lbounds, lb)
+		self.lbounds.insert(pos, lb)
+		self.numbers.insert(pos, ecn)
+		if self.member[ecn] >= self.mature_members:
+			pos = bisect.bisect_right(self.mature_lbounds, lb)
+			self.mature_lbounds.insert(pos, lb)
+			self.mature_numbers.insert(pos, ecn)
+
+	def _remove(self, ecn):
+		pos = self._position(ecn, self.lbounds, self.numbers)
+		del self.lbounds[pos]
+		del self.numbers[pos]
+		if self.member[ecn] >= self.mature_members:
+			pos = self._position(ecn, self.mature_lbounds, self.mature_numbers)
+			del self.mature_lbounds[pos]
+			del self.mature_numbers[pos]
+
+	def create(self, lb, ub):
+		'''
+		Append a new live EC holding one member and return its number
+		'''
+		ecn = len(self.member)
+		self.lbound.append(lb)
+		self.ubound.append(ub)
+		self.member.append(1)
+		self.deprecated.append(0)
+		self._insert(ecn)
+		if self.peak < 1:
+			self.peak = 1
+		return ecn
+
+	def join(self, ecn):
+		'''
+		Count one more member in an EC and return the new member count
+		'''
+		member = self.member[ecn] + 1
+		self.member[ecn] = member
+		if member > self.peak:
+			self.peak = member
+		if member == self.mature_members and not self.deprecated[ecn]:
+			# the EC just matured
+			lb = self.lbound[ecn]
+			pos = bisect.bisect_right(self.mature_lbounds, lb)
+			self.mature_lbounds.insert(pos, lb)
+			self.mature_numbers.insert(pos, ecn)
+		return member
+
+	def deprecate(self, ecn):
+		'''
+		Mark an EC deprecated and drop it from the index
+		'''
+		self.deprecated[ecn] = 1
+		self._remove(ecn)
+
+	def revive(self, ecn):
+		'''
+		Bring a deprecated EC back into service
+		'''
+		self.deprecated[ecn] = 0
+		self._insert(ecn)
+
+	def set_bounds(self, ecn, lb, ub):
+		'''
+		Move the boundaries of a live EC
+		'''
+		if lb != self.lbound[ecn]:
+			self._remove(ecn)
+			self.lbound[ecn] = lb
+			self._insert(ecn)
+		self.ubound[ecn] = ub
+
+	def merge(self, ecn, other):
+		'''
+		Fold a live EC into the live EC next to it: ecn then spans both ranges and counts both members, other is deprecated
+		Return the new member count of ecn
+		'''
+		lb = min(self.lbound[ecn], self.lbound[other])
+		ub = max(self.ubound[ecn], self.ubound[other])
+		member = self.member[ecn] + self.member[other]
+
+		self.deprecate(other)
+		self._remove(ecn)
+		self.lbound[ecn] = lb
+		self.ubound[ecn] = ub
+		self.member[ecn] = member
+		self._insert(ecn)
+
+		if member > self.peak:
+			self.peak = member
+		return member
+
+	def clear_members(self):
+		'''
+		Reset the member count of every EC to 0, the bounds are kept
+		'''
+		self.member = array('i', [0]) * len(self.member)
+		self.mature_lbounds = array('d')
+		self.mature_numbers = array('i')
+		self.peak = 0
+
+	def nbytes(self):
+		'''
+		Return the bytes held by the EC columns and indices
+		'''
+		return sum(sys.getsizeof(column) for column in (self.lbound, self.ubound, self.member, self.deprecated, self.lbounds, self.numbers, self.mature_lbounds, self.mature_numbers))
+
+	def compact(self, keep=()):
+		'''
+		Drop the deprecated ECs (except the numbers in keep) and renumber the others, in the same order
+		Return the array mapping former EC numbers to the new ones (-1: dropped)
+		'''
+		mapping = array('i', [-1]) * len(self.member)
+
+		lbound = array('d')
+		ubound = array('d')
+		member = array('i')
+		deprecated = bytearray()
+		for n in range(len(self.member)):
+			if self.deprecated[n] and n not in keep:
+				continue
+			mapping[n] = len(member)
+			lbound.append(self.lbound[n])
+			ubound.append(self.ubound[n])
+			member.append(self.member[n])
+			deprecated.append(self.deprecated[n])
+
+		self.lbound = lbound
+		self.ubound = ubound
+		self.member = member
+		self.deprecated = deprecated
+		# the index order is unchanged, only the numbers are
+		self.numbers = array('i', [mapping[n] for n in self.numbers])
+		self.mature_numbers = array('i', [mapping[n] for n in self.mature_numbers])
+		# self.peak stays: it decides the refresh and counts the dropped ECs as well
+
+		return mapping
+
+	def find(self, value):
+		'''
+		Return the number of the live EC covering value, or -1
+		'''
+		pos = bisect.bisect_right(self.lbounds, value) - 1
+		if pos >= 0 and self.ubound[self.numbers[pos]] > value:
+			return self.numbers[pos]
+		return -1
+
+	def find_many(self, values):
+		'''
+		Return the numbers of the live ECs covering each of the values (-1 where none)
+		'''
+		if not self.numbers:
+			return [-1] * len(values)
+		if numpy is None:
+			return [self.find(value) for value in values]
+
+		# vectorized bisection against copies of the index (a buffer view would lock the arrays against resizing)
+		values = numpy.asarray(values, dtype=numpy.float64)
+		numbers = numpy.array(self.numbers, dtype=numpy.int64)
+		pos = numpy.searchsorted(numpy.array(self.lbounds, dtype=numpy.float64), values, side="right") - 1
+		hit = numbers[numpy.maximum(pos, 0)]
+		covered = (pos >= 0) & (numpy.array(self.ubound, dtype=numpy.float64)[hit] > values)
+		return numpy.where(covered, hit, -1).tolist()
+
+	def overlapping(self, lb, ub):
+		'''
+		Return the numbers of the live ECs intersecting the open range (lb, ub), in bound order
+		'''
+		end = bisect.bisect_left(self.lbounds, ub)
+		start = end
+		while start > 0 and self.ubound[self.numbers[start - 1]] > lb:
+			start -= 1
+		return self.numbers[start:end]
+
+	def neighbours(self, value):
+		'''
+		Return [below_ecn, above_ecn] of the live ECs right around a value not covered by any of them (-1 if none)
+		'''
+		pos = bisect.bisect_right(self.lbounds, value)
+		below = self.numbers[pos - 1] if pos > 0 else -1
+		above = self.numbers[pos] if pos < len(self.numbers) else -1
+		return [below, above]
+
+	def _closest(self, value, lbounds, numbers):
+		# return the EC numbers of an index at the least boundary distance to value, in ascending order
+		pos = bisect.bisect_right(lbounds, value)
+
+		# only the ECs right around value can be the closest (the one below may tie when the covering EC touches it)
+		found = []
+		for i in range(max(pos - 2, 0), min(pos + 1, len(numbers))):
+			n = numbers[i]
+			found.append([min( abs(self.ubound[n] - value), abs(self.lbound[n] - value) ), n])
+
+		if not found:
+			return 0, []
+
+		dist = min(found)[0]
+		return dist, sorted(n for d, n in found if d == dist)
+
+	def nearest(self, value):
+		'''
+		Return [closest_ecn, closest_ecn_alt] of the live ECs by boundary distance to value
+		Ties are resolved to the lowest EC number, the alternative is the highest other EC number at the same (non-zero) distance
+		'''
+		dist, ties = self._closest(value, self.lbounds, self.numbers)
+
+		if not ties:
+			return [-1, -1]
+
+		if dist > 0 and len(ties) > 1:
+			return [ties[0], ties[-1]]
+		return [ties[0], -1]
+
+	def nearest_mature(self, value):
+		'''
+		Return the mature live EC closest to value by boundary distance (ties to the lowest EC number), or -1
+		'''
+		dist, ties = self._closest(value, self.mature_lbounds, self.mature_numbers)
+		return ties[0] if ties else -1
+
+
+class AccumulationQueue:
+	'''
+	Accumulated tuples in deadline order, with the tuples waiting on each EC indexed by (qi, EC number)
+	Entries are [counter, original value, QI_EC_indicator, deadline, key]. The key is a sequence number given by the queue (the caller's
+	counters need not be unique). Every tuple gets the same delay budget, so arrival order is expiry order and the head is always the next tuple to expire
 	'''
 
-	global EC_list, Accumulated_list, Compromised_range_dict, EC_alter_log, Init_timer, Last_arrival_time
+	__slots__ = ("qi_pos", "entries", "waiters", "pending", "seq")
+
+	def __init__(self, qi_pos):
+		self.qi_pos = qi_pos
+		# key -> entry, the longest accumulated tuple first
+		self.entries = OrderedDict()
+		# (qi, EC number) -> {key: entry} of the tuples holding that EC
+		self.waiters = {}
+		# key -> entry of the tuples to re-evaluate for publication
+		self.pending = {}
+		# key of the next queued tuple
+		self.seq = 0
+
+	def __len__(self):
+		return len(self.entries)
+
+	def __iter__(self):
+		return iter(self.entries.values())
+
+	def head(self):
+		'''
+		Return the longest accumulated tuple
+		'''
+		return next(iter(self.entries.values()))
+
+	def append(self, entry):
+		'''
+		Queue a tuple under the next key and register it as a waiter of its ECs, return the key
+		'''
+		key = entry[4] = self.seq
+		self.seq += 1
+		self.entries[key] = entry
+		for qi in self.qi_pos:
+			ec = (qi, entry[2][qi])
+			if ec in self.waiters:
+				self.waiters[ec][key] = entry
+			else:
+				self.waiters[ec] = {key: entry}
+		return key
+
+	def remove(self, entry):
+		'''
+		Take a tuple out of the queue (published)
+		'''
+		key = entry[4]
+		del self.entries[key]
+		self.pending.pop(key, None)
+		for qi in self.qi_pos:
+			self._unwait(qi, entry[2][qi], key)
+
+	def popleft(self):
+		'''
+		Take the longest accumulated tuple out of the queue
+		'''
+		entry = self.head()
+		self.remove(entry)
+		return entry
+
+	def _unwait(self, qi, ecn, key):
+		ec = (qi, ecn)
+		waiting = self.waiters[ec]
+		del waiting[key]
+		if not waiting:
+			del self.waiters[ec]
+
+	def remap(self, qi, ecn, new_ecn, lb, ub):
+		'''
+		Move the tuples waiting on an EC whose QI value lies within [lb, ub) to another EC, and schedule them for re-evaluation
+		'''
+		waiting = self.waiters.get((qi, ecn))
+		if not waiting:
+			return
+
+		moved = {}
+		for key, entry in waiting.items():
+			if lb <= entry[1][qi] < ub:
+				entry[2][qi] = new_ecn
+				moved[key] = entry
+
+		if not moved:
+			return
+
+		# move the waiter lists in bulk
+		if len(moved) == len(waiting):
+			del self.waiters[(qi, ecn)]
+		else:
+			for key in moved:
+				del waiting[key]
 
-	# initialize EC list
-	EC_list = []
+		key = (qi, new_ecn)
+		if key in self.waiters:
+			self.waiters[key].update(moved)
+		else:
+			self.waiters[key] = moved
+		self.pending.update(moved)
+
+	def referenced(self, qi):
+		'''
+		Return the EC numbers of a QI held by queued tuples
+		'''
+		return {ecn for q, ecn in self.waiters if q == qi}
+
+	def renumber(self, qi, mapping):
+		'''
+		Apply a renumbering of the ECs of a QI (see ECStore.compact()) to the queued tuples
+		'''
+		waiters = {}
+		for key, waiting in self.waiters.items():
+			if key[0] == qi:
+				new_ecn = mapping[key[1]]
+				for entry in waiting.values():
+					entry[2][qi] = new_ecn
+				key = (qi, new_ecn)
+			waiters[key] = waiting
+		self.waiters = waiters
+
+	def rebind(self, qi, ecns):
+		'''
+		Point every queued tuple to the EC of a QI given by ecns (key -> EC number) and schedule them all for re-evaluation
+		'''
+		self.waiters = {ec: waiting for ec, waiting in self.waiters.items() if ec[0] != qi}
+		for key, entry in self.entries.items():
+			ecn = entry[2][qi] = ecns[key]
+			ec = (qi, ecn)
+			if ec in self.waiters:
+				self.waiters[ec][key] = entry
+			else:
+				self.waiters[ec] = {key: entry}
+		self.pending.update(self.entries)
+
+	def mark(self, entry):
+		'''
+		Schedule a queued tuple for re-evaluation
+		'''
+		self.pending[entry[4]] = entry
+
+	def mark_waiters(self, qi, ecn):
+		'''
+		Schedule every tuple waiting on an EC for re-evaluation
+		'''
+		waiting = self.waiters.get((qi, ecn))
+		if waiting:
+			self.pending.update(waiting)
+
+	def nbytes(self):
+		'''
+		Return the approximate bytes held by the accumulated tuples and their indices
+		'''
+		size = sys.getsizeof(self.entries) + sys.getsizeof(self.waiters) + sys.getsizeof(self.pending)
+		for entry in self.entries.values():
+			size += sys.getsizeof(entry) + sys.getsizeof(entry[1]) + sys.getsizeof(entry[2]) + sum(sys.getsizeof(value) for value in entry[1])
+		for waiting in self.waiters.values():
+			size += sys.getsizeof(waiting)
+		return size
+
+	def take_pending(self):
+		'''
+		Return the tuples scheduled for re-evaluation in deadline order and clear the schedule
+		'''
+		pending = [self.pending[key] for key in sorted(self.pending)]
+		self.pending.clear()
+		return pending
+
+
+class Clock:
+	'''
+	Wall-clock time source of a session (refresh timer, DoS detection, anonymization delays)
+	'''
 
-	for i in range(max(QI_POS) + 1):
-		EC_list.append([])
+	def time(self):
+		return time.time()
 
-	# initialize the accumulated tuple list
-	Accumulated_list = []
+	def sleep(self, seconds):
+		time.sleep(seconds)
 
-	# initialize dictionary for compromised range
-	Compromised_range_dict = {}
+	def advance_to(self, timestamp):
+		# the wall clock moves by itself
+		pass
 
-	# initialize dictionary for EC changes
-	EC_alter_log = {}
 
-	# initialize timer
-	Init_timer = time.time()
 
-	# init DoS detector
-	Last_arrival_time = 0
+class VirtualClock(Clock):
+	'''
+	Simulated time for replaying recordings as fast as possible
+	The time only moves on sleep() or when set from the timestamps of the tuples, so refresh and delay semantics stay those of real time
+	'''
 
+	def __init__(self, start=0.0):
+		self.now = start
 
+	def time(self):
+		return self.now
 
-def publish(rawstring, QI_EC_indicator, compmode):
+	def sleep(self, seconds):
+		self.now += seconds
+
+	def advance_to(self, timestamp):
+		# time never runs backwards (out-of-order timestamps)
+		if timestamp > self.now:
+			self.now = timestamp
+
+
+
+class Metrics:
 	'''
-	Publish data for transmission (ready to leave the device)
+	Counters, gauges and timers of the anonymizer hot path
+	Sessions without Metrics (the default) skip all instrumentation
 	'''
 
-	# normal mode
-	if not compmode:
-		# for each QI position in the raw input tuple
-		for n in QI_POS:
-			# find the belonged EC
-			ec = EC_list[n][QI_EC_indicator[n]]
-			# replace actual QI value with generalized range
-			rawstring[n] = [ec.get("lbound"), ec.get("ubound")]
-
-	# compromised mode
-	else:
-		#debug
-		#print("comp mode")
-		
-		for n in QI_POS:
-			if n in Compromised_range_dict:
-				# rewrite with compromised range
-				rawstring[n] = Compromised_range_dict[n]
+	def __init__(self, prefix="verwischen"):
+		self.prefix = prefix
+		# name -> count
+		self.counters = {}
+		# name -> last value
+		self.gauges = {}
+		# name -> [observations, total seconds, longest seconds]
+		self.timers = {}
+
+	def count(self, name, n=1):
+		self.counters[name] = self.counters.get(name, 0) + n
+
+	def set(self, name, value):
+		self.gauges[name] = value
+
+	def observe(self, name, seconds):
+		timer = self.timers.get(name)
+		if timer is None:
+			timer = self.timers[name] = [0, 0.0, 0.0]
+		timer[0] += 1
+		timer[1] += seconds
+		if seconds > timer[2]:
+			timer[2] = seconds
+
+	def snapshot(self):
+		'''
+		Return a copy of all metrics: {"counters": {...}, "gauges": {...}, "timers": {name: {"count", "total_seconds", "max_seconds"}}}
+		'''
+		return {
+			"counters": dict(self.counters),
+			"gauges": dict(self.gauges),
+			"timers": {name: {"count": t[0], "total_seconds": t[1], "max_seconds": t[2]} for name, t in self.timers.items()},
+		}
+
+	def prometheus(self):
+		'''
+		Render the metrics in the Prometheus text exposition format
+		'''
+		lines = []
+		for name, value in sorted(self.counters.items()):
+			metric = "%s_%s_total" % (self.prefix, name)
+			lines.append("# TYPE %s counter" % metric)
+			lines.append("%s %d" % (metric, value))
+		for name, value in sorted(self.gauges.items()):
+			metric = "%s_%s" % (self.prefix, name)
+			lines.append("# TYPE %s gauge" % metric)
+			lines.append("%s %r" % (metric, value))
+		for name, (n, total, longest) in sorted(self.timers.items()):
+			metric = "%s_%s_seconds" % (self.prefix, name)
+			lines.append("# TYPE %s summary" % metric)
+			lines.append("%s_sum %r" % (metric, total))
+			lines.append("%s_count %d" % (metric, n))
+			lines.append("# TYPE %s_max gauge" % metric)
+			lines.append("%s_max %r" % (metric, longest))
+		return "\n".join(lines) + "\n"
+
+	def write(self, path):
+		'''
+		Write the Prometheus text dump to a file (replaced atomically, as scraped by a textfile collector)
+		'''
+		tmp = path + ".tmp"
+		with open(tmp, "w") as f:
+			f.write(self.prometheus())
+		os.replace(tmp, path)
+
+
+
+class RecordSchema:
+	'''
+	Layout of the input tuples and published records of a config, compiled once: column roles, output projection and indicator slots
+	Structured form of the published records:
+		{"ranges": [[lb, ub] per QI in QI_POS order], "fields": [retained non-QI fields], "compromised": bool, "arrival": seconds or null, "published": seconds}
+	arrival is only known in EXPERIMENT_MODE
+	Encoded as JSON lines, or as length-prefixed binary frames:
+		uint32 payload length | uint8 compromised | uint16 ranges | uint16 fields | double published | double arrival (NaN: unknown)
+		| ranges * 2 double | fields * (uint16 length | utf-8)
+	all little-endian, binary fields are strings
+	'''
+
+	HEADER = struct.Struct("<IBHHdd")
+	FIELD_LENGTH = struct.Struct("<H")
+
+	def __init__(self, config):
+		qi_pos = list(config.QI_POS)
+		id_pos = set(config.ID_POS)
+
+		# input columns laid out by the config, the fields beyond are published as they are
+		self.width = max(qi_pos + list(id_pos)) + 1
+		# role of every input column: "qi", "id" or "field"
+		self.roles = ["qi" if i in qi_pos else "id" if i in id_pos else "field" for i in range(self.width)]
+
+		# output projection: the input positions of the published columns (the ID_POS fields dropped, in any order)
+		self.keep = [i for i in range(self.width) if i not in id_pos]
+		self._take = operator.itemgetter(*self.keep) if len(self.keep) > 1 else lambda tup: (tup[self.keep[0]],)
+		# published records lose their ID_POS fields, which shifts the QI positions
+		self.qi_out = [self.keep.index(qi) for qi in qi_pos]
+		self.qi_set = set(self.qi_out)
+
+		# blank QI_EC_indicator: the EC number of every QI, by input position (-1: no EC)
+		self.indicator = array('i', [-1]) * (max(qi_pos) + 1)
+
+		# names of the published columns, if the config names the input columns (the ones beyond width are published as they are)
+		columns = getattr(config, "COLUMNS", None)
+		self.names = [columns[i] if i < len(columns) else None for i in self.keep + list(range(self.width, len(columns)))] if columns else None
+
+	def project(self, tup, ranges):
+		'''
+		Build the published record of an input tuple: its kept columns with the QI fields replaced by their ranges (in QI_POS order),
+		followed by the fields beyond the configured columns. The tuple itself is left untouched
+		'''
+		record = list(self._take(tup))
+		for pos, rng in zip(self.qi_out, ranges):
+			record[pos] = rng
+		if len(tup) > self.width:
+			record.extend(tup[self.width:])
+		return record
+
+	def position(self, name):
+		'''
+		Return the position of a named column in the published records
+		'''
+		return self.names.index(name)
+
+	def to_named(self, record):
+		'''
+		Return the named columns of a published record as a dict
+		'''
+		return {name: value for name, value in zip(self.names, record) if name is not None}
+
+	def to_dict(self, record, delay=None, compromised=False, published=None):
+		return {
+			"ranges": [list(record[pos]) for pos in self.qi_out],
+			"fields": [record[i] for i in range(len(record)) if i not in self.qi_set],
+			"compromised": bool(compromised),
+			"arrival": published - delay if delay is not None and published is not None else None,
+			"published": published,
+		}
+
+	def to_record(self, d):
+		'''
+		Rebuild the published record (list) of a structured record
+		'''
+		record = [None] * (len(d["ranges"]) + len(d["fields"]))
+		for pos, rng in zip(self.qi_out, d["ranges"]):
+			record[pos] = rng
+		fields = iter(d["fields"])
+		for i in range(len(record)):
+			if i not in self.qi_set:
+				record[i] = next(fields)
+		return record
+
+	def encode_json(self, record, delay=None, compromised=False, published=None):
+		return json.dumps(self.to_dict(record, delay, compromised, published), separators=(",", ":")) + "\n"
+
+	def encode_binary(self, record, delay=None, compromised=False, published=None):
+		fields = [str(record[i]).encode() for i in range(len(record)) if i not in self.qi_set]
+		arrival = published - delay if delay is not None and published is not None else math.nan
+
+		parts = [struct.pack("<%dd" % (2 * len(self.qi_out)), *[bound for pos in self.qi_out for bound in record[pos]])]
+		for field in fields:
+			parts.append(self.FIELD_LENGTH.pack(len(field)))
+			parts.append(field)
+		body = b"".join(parts)
+
+		# the length prefix counts everything after itself
+		return self.HEADER.pack(self.HEADER.size - 4 + len(body), bool(compromised), len(self.qi_out), len(fields), published if published is not None else math.nan, arrival) + body
+
+
+def read_jsonl(path, chunk_lines=65536):
+	'''
+	Yield the structured records of a JSON-lines file, parsed in bulk (one json.loads per chunk of lines)
+	'''
+
+	with open(path) as f:
+		while True:
+			lines = list(itertools.islice(f, chunk_lines))
+			if not lines:
+				return
+			lines = [line for line in lines if line.strip()]
+			if lines:
+				yield from json.loads("[" + ",".join(lines) + "]")
+
+
+def read_binary(path):
+	'''
+	Yield the structured records of a file of length-prefixed binary frames
+	'''
+
+	header = RecordSchema.HEADER
+	field_length = RecordSchema.FIELD_LENGTH
+
+	with open(path, "rb") as f:
+		data = f.read()
+
+	offset = 0
+	while offset < len(data):
+		length, compromised, n_ranges, n_fields, published, arrival = header.unpack_from(data, offset)
+		end = offset + 4 + length
+		offset += header.size
+
+		bounds = struct.unpack_from("<%dd" % (2 * n_ranges), data, offset)
+		offset += 16 * n_ranges
+
+		fields = []
+		for i in range(n_fields):
+			n = field_length.unpack_from(data, offset)[0]
+			offset += field_length.size
+			fields.append(data[offset:offset + n].decode())
+			offset += n
+
+		if offset != end:
+			raise Exception("Error: Corrupted record frame detected.")
+
+		yield {
+			"ranges": [list(bounds[i:i + 2]) for i in range(0, len(bounds), 2)],
+			"fields": fields,
+			"compromised": bool(compromised),
+			"arrival": None if math.isnan(arrival) else arrival,
+			"published": None if math.isnan(published) else published,
+		}
+
+
+
+class Sink:
+	'''
+	Destination of the published records
+	write() receives the de-identified record, in EXPERIMENT_MODE the anonymization delay of the tuple (seconds),
+	whether it was published in compromised mode and the clock time of publication
+	'''
+
+	def write(self, record, delay=None, compromised=False, published=None):
+		raise NotImplementedError
+
+	def flush(self):
+		pass
+
+	def close(self):
+		self.flush()
+
+
+
+# records kept by the default sink of a Session / SessionManager, older ones are dropped
+DEFAULT_SINK_MAXLEN = 1024
+
+
+class MemorySink(Sink):
+	'''
+	Keep the published records in memory (the most recent maxlen ones if maxlen is given)
+	'''
+
+	def __init__(self, maxlen=None):
+		self.records = deque(maxlen=maxlen)
+		self.delays = deque(maxlen=maxlen)
+
+	def __len__(self):
+		return len(self.records)
+
+	def write(self, record, delay=None, compromised=False, published=None):
+		self.records.append(record)
+		if delay is not None:
+			self.delays.append(delay)
+
+	def take(self):
+		'''
+		Return the records kept so far and forget them
+		'''
+		# popped one by one, so records written meanwhile by another thread (DeadlineScheduler) are not lost
+		records = []
+		while self.records:
+			records.append(self.records.popleft())
+		while self.delays:
+			self.delays.popleft()
+		return records
+
+
+
+class BufferedFileSink(Sink):
+	'''
+	Append the published records (and delays, given delay_path) to files, one per line
+	Given a RecordSchema, records are written as JSON lines, or as binary frames if binary is set
+	Lines are buffered and written every flush_size records or flush_interval seconds, whichever comes first
+	'''
+
+	def __init__(self, path="output_tuple.txt", delay_path=None, flush_size=1024, flush_interval=1.0, schema=None, binary=False):
+		self.flush_size = flush_size
+		self.flush_interval = flush_interval
+
+		# record -> line (text: the record list as printed)
+		if schema is None:
+			self.encode = None
+		elif binary:
+			self.encode = schema.encode_binary
+		else:
+			self.encode = schema.encode_json
+
+		# the files stay open for the lifetime of the sink
+		self.file = open(path, "ab" if schema is not None and binary else "a")
+		self.delay_file = open(delay_path, "a") if delay_path is not None else None
+
+		self.lines = []
+		self.delay_lines = []
+		self.last_flush = time.monotonic()
+
+		# the sink may be shared by sessions published from different threads (DeadlineScheduler)
+		self.lock = threading.RLock()
+
+		# buffered records must not be lost when the interpreter exits
+		atexit.register(self.close)
+
+	def write(self, record, delay=None, compromised=False, published=None):
+		with self.lock:
+			if self.encode is None:
+				self.lines.append(str(record) + '\n')
 			else:
-				# find the belonged EC
-				ec = EC_list[n][QI_EC_indicator[n]]
-				# replace actual QI value with generalized range
-				rawstring[n] = [ec.get("lbound"), ec.get("ubound")]
+				self.lines.append(self.encode(record, delay, compromised, published))
+			if delay is not None and self.delay_file is not None:
+				self.delay_lines.append(str(delay) + '\n')
 
-		# reset the compromised record dictionary
-		Compromised_range_dict.clear()
+			if len(self.lines) >= self.flush_size or time.monotonic() - self.last_flush >= self.flush_interval:
+				self.flush()
 
+	def flush(self):
+		with self.lock:
+			if self.file is None:
+				return
 
-	# discard key identifier fields
-	jump = 0
-	for si in ID_POS:
-		# pop ID element
-		rawstring.pop(si - jump)
-		
-		# apply change of list order (due to element pop) to next SI
-		jump += 1
+			if self.lines:
+				self.file.writelines(self.lines)
+				self.lines = []
+			self.file.flush()
 
+			if self.delay_file is not None:
+				if self.delay_lines:
+					self.delay_file.writelines(self.delay_lines)
+					self.delay_lines = []
+				self.delay_file.flush()
 
-	# output
-	if EXPERIMENT_MODE:
-		# simulate output for transmission by printing the message to console
-		# in EXPERIMENT_MODE, last element of rawstring is the attached arrival timestamp of the tuple
-		print("Transmitted : ", rawstring[:-1])
+			self.last_flush = time.monotonic()
+
+	def close(self):
+		with self.lock:
+			if self.file is None:
+				return
+
+			self.flush()
+			self.file.close()
+			if self.delay_file is not None:
+				self.delay_file.close()
+			self.file = self.delay_file = None
+			atexit.unregister(self.close)
+
+
+
+class CallbackSink(Sink):
+	'''
+	Hand every published record over to a callable (e.g. the transmission routine of the device)
+	'''
+
+	def __init__(self, callback):
+		self.callback = callback
+
+	def write(self, record, delay=None, compromised=False, published=None):
+		self.callback(record)
+
+
+
+class ConsoleSink(Sink):
+	'''
+	Print every published record to the console
+	'''
+
+	def write(self, record, delay=None, compromised=False, published=None):
+		print("Transmitted : ", record)
+
+
+
+class TeeSink(Sink):
+	'''
+	Forward every published record to several sinks
+	'''
+
+	def __init__(self, *sinks):
+		self.sinks = sinks
+
+	def write(self, record, delay=None, compromised=False, published=None):
+		for sink in self.sinks:
+			sink.write(record, delay, compromised, published)
+
+	def flush(self):
+		for sink in self.sinks:
+			sink.flush()
+
+	def close(self):
+		for sink in self.sinks:
+			sink.close()
 
-		# For research paper use only
-		with open("output_tuple.txt", "a") as f:
-			f.write( str(rawstring[:-1]) + '\n' )
-		with open("output_delay.txt", "a") as f:
-			f.write( str(time.time() - rawstring[-1]) + '\n' )
-	else:
-		# simulate output for transmission by printing the message to console.
-		# should be replaced by actual mechanisms of the underlying device while being deployed to WMD
-		print("Transmitted : ", rawstring)
 
-	
-	
 
 # reserved function
 def purturbate(lbound, ubound, data, ev):
@@ -216,645 +1053,1618 @@ def purturbate(lbound, ubound, data, ev):
 	return [lbound, ubound]
 
 
+def parse_tuple(sensor_tuple, qi_pos):
+	'''
+	Split a raw input line into a tuple with its QI fields interpreted as float numbers
+	Raises ValueError or SyntaxError on invalid input
+	'''
+
+	# split data and strip whitespace
+	tup = [x.strip() for x in sensor_tuple.split(',')]
+
+	# designated quasi-identifier position is out of list range
+	if max(qi_pos) > len(tup) - 1:
+		raise SyntaxError
+
+	# interpret QI fields as float numbers
+	for qi in qi_pos:
+		tup[qi] = float(tup[qi])
+
+	return tup
+
+
+# ECs a QI holds at least before its deprecated ECs are compacted away
+COMPACTION_MIN_ECS = 64
+
+# layout version of the checkpoint files
+CHECKPOINT_VERSION = 5
+
+
+def _atomic_dump(obj, path):
+	# write to a temporary file first, so a crash never leaves a truncated checkpoint behind
+	tmp = path + ".tmp"
+	with open(tmp, "wb") as f:
+		pickle.dump(obj, f, pickle.HIGHEST_PROTOCOL)
+		f.flush()
+		os.fsync(f.fileno())
+	os.replace(tmp, path)
+
 
+def _report_invalid(line_no, line, reason):
+	print("Syslog: Invalid input at line ", line_no, " (", reason, "): ", line.rstrip())
 
-def create_EC(qi, lb, ub):
+
+def read_tuples(filepath, config, chunk_bytes=1 << 22, on_error=None, timestamp_pos=None):
 	'''
-	Generate a new cluster in the given QI group
+	Read an input file in chunks of about chunk_bytes and yield (line numbers, tuples) per chunk
+	Tuples are split by the C csv reader and their fields stripped of whitespace (as parse_tuple() does), only the QI fields (and timestamp_pos) are converted to float numbers
+	Malformed rows are skipped and reported to on_error(line number, line, reason), printed by default
 	'''
 
-	global EC_list
+	if on_error is None:
+		on_error = _report_invalid
+
+	qi_pos = config.QI_POS
+	numeric_pos = qi_pos if timestamp_pos is None else qi_pos + [timestamp_pos]
+	# QI and ID fields must be present
+	width = max(numeric_pos + config.ID_POS) + 1
+
+	line_no = 0
+	with open(filepath, newline='') as f:
+		while True:
+			lines = f.readlines(chunk_bytes)
+			if not lines:
+				return
+
+			numbers = []
+			rows = []
+			# without quoting, the csv reader yields exactly one row per line
+			for line, row in zip(lines, csv.reader(lines, quoting=csv.QUOTE_NONE)):
+				line_no += 1
+				if not row:
+					continue
+				row = [field.strip() for field in row]
+				if len(row) < width:
+					on_error(line_no, line, "missing fields")
+					continue
+				try:
+					for pos in numeric_pos:
+						row[pos] = float(row[pos])
+				except ValueError:
+					on_error(line_no, line, "non-numeric field")
+					continue
 
-	# the newly created EC will be the (EC_position)th EC of the QI
-	EC_position = len(EC_list[qi])
+				numbers.append(line_no)
+				rows.append(row)
 
-	# init new EC
-	ec = {
-		'number': EC_position,
-		'member': 1,
-		'lbound': lb,
-		'ubound': ub,
-		'deprecated': False
-	}
+			yield numbers, rows
 
-	#debug
-	#print("createec-bef: ", EC_list[qi])
-	
-	# add to EC list of the QI
-	EC_list[qi].append(ec)
-	
-	#debug
-	#print("createec-aft: ", EC_list[qi])
 
-	# return the EC position in list 
-	return EC_position
 
 
-def extend_EC(qi, ecn1, ecn2, original_value):
+class Session:
 	'''
-	Extend ECs to cover ranges that are not enough to support the establishment of new EC
-	Used only on new data arrival (not forced)
+	One anonymizer stream: its configuration and all the internally used state
+	Without a sink, published records are not transmitted anywhere: only the last DEFAULT_SINK_MAXLEN are kept in memory
 	'''
 
-	global EC_list
+	__slots__ = ("config", "schema", "sink", "clock", "metrics", "lock", "EC_list", "Accumulated_list", "Compromised_range_dict", "EC_alter_log", "Shadow", "Refresh_queue", "Init_timer", "Last_arrival_time", "tuple_counter", "experiment_mode", "checkpoint_path", "checkpoint_interval", "last_checkpoint", "clock_anchored")
 
-	# sort the two EC
-	if EC_list[qi][ecn1].get("ubound") > EC_list[qi][ecn2].get("ubound"):
-		# swap
-		ecn1, ecn2 = ecn2, ecn1
+	def __init__(self, config=None, sink=None, clock=None, metrics=None):
+		# configurable parameters (may be shared between sessions)
+		self.config = config if config is not None else Config()
 
-	# get average
-	avg = ( EC_list[qi][ecn2].get("lbound") + EC_list[qi][ecn1].get("ubound") ) / 2
+		# RecordSchema compiled from the config (on initialize())
+		self.schema = None
 
-	# replace the original boundaries
-	EC_list[qi][ecn1]["ubound"] = EC_list[qi][ecn2]["lbound"] = avg
+		# Metrics collecting the hot path instrumentation (None: disabled)
+		self.metrics = metrics
 
-	# return the new EC that the value falls in 
-	if original_value > avg:
-		return ecn2
-	else:
-		return ecn1
+		# Sink receiving every published record
+		# by default only the last DEFAULT_SINK_MAXLEN records are kept in memory: a deployment must set its transmission sink (setSink())
+		self.sink = sink if sink is not None else MemorySink(DEFAULT_SINK_MAXLEN)
 
+		# time source (a VirtualClock replays recordings at full speed)
+		self.clock = clock if clock is not None else Clock()
 
+		# guards the state against the DeadlineScheduler thread
+		self.lock = threading.RLock()
 
-def generalize(qi, data):
-	'''
-	Prepare a generalized range for a given data point of the QI
-	'''
+		##! Internally Used Variables (DO NOT alter)
 
-	global EC_list
+		# EC_list : list of ECStore, one per QI position
+		self.EC_list = []
 
-	# define lower and higher bound of generalized value 
-	left_padding = random.random() * GENERALIZE_RANGE
+		# the AccumulationQueue storing accumulated tuples
+		# [counter, original value, QI_EC_indicator, deadline, key in the queue]
+		self.Accumulated_list = None
 
-	lb_new = data - left_padding
-	ub_new = lb_new + GENERALIZE_RANGE
-	overlap = []
+		# dictionary for storing the compromised range for essential publication
+		self.Compromised_range_dict = {}
 
-	# check if overlap with existing ECs
-	def review_overlap(f):
-		nonlocal lb_new, ub_new, overlap
+		# dictionary for recording EC change during expiring tuple resolution process
+		self.EC_alter_log = {}
 
-		if f == 0:
-			overlap = []
-		QIEC = EC_list[qi]
+		# rolling refresh (REFRESH_WARMUP > 0): the warming EC generation of one QI
+		# [qi, ECStore, {queue key: EC number} of the tuples accumulated since, tuples left to warm up] or None
+		self.Shadow = None
+
+		# QIs still to renew in the current rolling refresh
+		self.Refresh_queue = []
+
+		# The timer for EC refreshing
+		self.Init_timer = 0
+
+		# DoS detection
+		self.Last_arrival_time = None
+
+		# counter of the next tuple (advanced by process(), stream_input() feeds it)
+		self.tuple_counter = 0
+
+		# For research paper use only
+		self.experiment_mode = False
+
+		# periodic checkpoints (see setCheckpoint())
+		self.checkpoint_path = None
+		self.checkpoint_interval = 0
+		self.last_checkpoint = 0
+
+		# whether the timers run on the time of the tuple timestamps yet (see advance_clock())
+		self.clock_anchored = False
+
+		self.initialize()
+
+
+	def read_config(self, path="config.ini"):
+		'''
+		Load the configuration of the session from config.ini
+		'''
+
+		self.config = load_config(path)
+
+
+	def initialize(self):
+		'''
+		Initialize session state
+		'''
+
+		cfg = self.config
+
+		# compile the layout of the tuples and records
+		self.schema = RecordSchema(cfg)
+
+		# initialize EC list (only QI positions hold ECs)
+		self.EC_list = []
+
+		for i in range(max(cfg.QI_POS) + 1):
+			# ECs holding more than THRESHOLD_K members serve compromised publications
+			self.EC_list.append(ECStore(cfg.THRESHOLD_K + 1) if i in cfg.QI_POS else None)
+
+		# initialize the accumulated tuple queue
+		self.Accumulated_list = AccumulationQueue(cfg.QI_POS)
+
+		# initialize dictionary for compromised range
+		self.Compromised_range_dict = {}
+
+		# initialize dictionary for EC changes
+		self.EC_alter_log = {}
+
+		# no rolling refresh in progress
+		self.Shadow = None
+		self.Refresh_queue = []
+
+		# initialize timer
+		self.Init_timer = self.clock.time()
+
+		# init DoS detector
+		self.Last_arrival_time = None
+
+
+	def publish(self, rawstring, QI_EC_indicator, compmode):
+		'''
+		Publish data for transmission (ready to leave the device)
+		'''
+
+		cfg = self.config
+
+		# the generalized range of each QI, in QI_POS order
+		ranges = []
+
+		# normal mode
+		if not compmode:
+			for n in cfg.QI_POS:
+				# find the belonged EC
+				ecs = self.EC_list[n]
+				ecn = QI_EC_indicator[n]
+				ranges.append([ecs.lbound[ecn], ecs.ubound[ecn]])
+
+		# compromised mode
+		else:
+			#debug
+			#print("comp mode")
+		
+			for n in cfg.QI_POS:
+				if n in self.Compromised_range_dict:
+					# publish with compromised range
+					ranges.append(self.Compromised_range_dict[n])
+				else:
+					# find the belonged EC
+					ecs = self.EC_list[n]
+					ecn = QI_EC_indicator[n]
+					ranges.append([ecs.lbound[ecn], ecs.ubound[ecn]])
+
+			# reset the compromised record dictionary
+			self.Compromised_range_dict.clear()
+
+		# replace actual QI values with generalized ranges and discard key identifier fields
+		record = self.schema.project(rawstring, ranges)
+
+		if self.metrics is not None:
+			self.metrics.count("published" if not compmode else "published_compromised")
+
+		# output
+		published = self.clock.time()
+		if self.experiment_mode:
+			# in EXPERIMENT_MODE, last element of the record is the attached arrival timestamp of the tuple
+			arrival = record.pop()
+			self.sink.write(record, published - arrival, compmode, published)
+		else:
+			# the sink stands for the transmission mechanism of the underlying device while being deployed to WMD
+			self.sink.write(record, None, compmode, published)
+
+	
+	
+
+	def create_EC(self, qi, lb, ub, ecs=None):
+		'''
+		Generate a new cluster in the given QI group (in the EC store ecs instead of the current one if given)
+		'''
+
+		if ecs is None:
+			ecs = self.EC_list[qi]
+
+		#debug
+		#print("createec-bef: ", self.EC_list[qi])
+	
+		# init new EC (holding one member) in the EC store of the QI
+		# the newly created EC will be the (EC_position)th EC of the QI
+		EC_position = ecs.create(lb, ub)
+
+		if self.metrics is not None:
+			self.metrics.count("ec_created")
+	
+		#debug
+		#print("createec-aft: ", self.EC_list[qi])
+
+		# return the EC position in list 
+		return EC_position
+
+
+	def extend_EC(self, qi, ecn1, ecn2, original_value, ecs=None):
+		'''
+		Extend ECs to cover ranges that are not enough to support the establishment of new EC
+		Used only on new data arrival (not forced)
+		'''
+
+		if ecs is None:
+			ecs = self.EC_list[qi]
+
+		# sort the two EC
+		if ecs.ubound[ecn1] > ecs.ubound[ecn2]:
+			# swap
+			ecn1, ecn2 = ecn2, ecn1
+
+		# get average
+		avg = ( ecs.lbound[ecn2] + ecs.ubound[ecn1] ) / 2
+
+		# replace the original boundaries
+		ecs.set_bounds(ecn1, ecs.lbound[ecn1], avg)
+		ecs.set_bounds(ecn2, avg, ecs.ubound[ecn2])
+
+		if self.metrics is not None:
+			self.metrics.count("ec_boundary_merges")
+
+		# return the new EC that the value falls in 
+		if original_value > avg:
+			return ecn2
+		else:
+			return ecn1
+
+
+
+	def generalize(self, qi, data, ecs=None):
+		'''
+		Prepare a generalized range for a given data point of the QI (in the EC store ecs instead of the current one if given)
+		'''
+
+		cfg = self.config
+
+		if ecs is None:
+			ecs = self.EC_list[qi]
+
+		# define lower and higher bound of generalized value 
+		left_padding = random.random() * cfg.GENERALIZE_RANGE
+
+		lb_new = data - left_padding
+		ub_new = lb_new + cfg.GENERALIZE_RANGE
+		overlap = []
+
+		# the data point is covered by no live EC, so only the live ECs right below and above it can be overlaid
+		below, above = ecs.neighbours(data)
+
+		# check if overlap with existing ECs
+		def review_overlap(f):
+			nonlocal lb_new, ub_new, overlap
+
+			if f == 0:
+				overlap = []
+			QIEC = ecs
 
-		# check over all ECs of the given QI
-		for i in range(len(QIEC)):
-			# if EC deprecated, skip
-			if QIEC[i].get("deprecated"):
-				continue
 			# [...]: existed EC ; |...| new generalized range
 			# | .. [ .. | .. ]
-			if lb_new < QIEC[i].get("lbound") < ub_new:
+			if above != -1 and lb_new < QIEC.lbound[above] < ub_new:
 				# 0 for lower bound overlays
-				msg = [i, 0, QIEC[i].get("lbound")]
-				
-				if EXPERIMENT_MODE:
+				msg = [above, 0, QIEC.lbound[above]]
+
+				if self.experiment_mode:
 					print("f=",f, ", msg=", msg)
+
+				# re-adjust
+				overlap.append(msg)
 			# [ .. | .. ] .. |
-			elif lb_new < QIEC[i].get("ubound") < ub_new:
+			if below != -1 and lb_new < QIEC.ubound[below] < ub_new:
 				# 1 represents upper bound
-				msg = [i, 1, QIEC[i].get("ubound")]
+				msg = [below, 1, QIEC.ubound[below]]
 
-				if EXPERIMENT_MODE:
+				if self.experiment_mode:
 					print("f=",f, ", msg=", msg)
 
 				# re-adjust
 				overlap.append(msg)
 			# other possibilities:
 			# if [ .. | .. | .. ] => should already able to fit in existed EC, hence impossible.
-			# if | .. [ .. ] .. | => the size of EC will only be larger or equal to GENERALIZE_RANGE. The new generalized range equals exactly to GENERALIZE_RANGE, so existed EC will never be a subset of it.
+			# if | .. [ .. ] .. | => ECs narrower than GENERALIZE_RANGE (trimmed by extend_EC_force) lie beyond the neighbours and are never reached.
 			# if [ .. ] .. | .. | => no issue on creating new EC.
 
 
-		# evaluate EC overlays
+			# evaluate EC overlays
+
+			if len(overlap) == 0 or (len(overlap) == 1 and f == 1):
+				return True
+
+			elif len(overlap) == 1 and f == 0:
+				if overlap[0][1] == 0:
+					# if new range overlayed with the lower bound of an EC, update the upper bound of new range to the lower bound of existed EC.
+					ub_new = overlap[0][2]
+					lb_new = ub_new - cfg.GENERALIZE_RANGE
+				elif overlap[0][1] == 1:
+					# if new range overlayed with the upper bound of an EC, update the lower bound of new range to the upper bound of existed EC.
+					lb_new = overlap[0][2]
+					ub_new = lb_new + cfg.GENERALIZE_RANGE
+				else:
+					raise Exception("Internal Logic Error detected in func generalize().")
+				# run the range asessment again
+				return review_overlap(1)
 
-		if len(overlap) == 0 or (len(overlap) == 1 and f == 1):
-			return True
+			# overlap 2 or overlap 1 on each side indicate the available range for creating a new EC is smaller than GENERALIZE_RANGE => extend existing EC instead
+			elif len(overlap) == 2:
+				return False
 
-		elif len(overlap) == 1 and f == 0:
-			if overlap[0][1] == 0:
-				# if new range overlayed with the lower bound of an EC, update the upper bound of new range to the lower bound of existed EC.
-				ub_new = overlap[0][2]
-				lb_new = ub_new - GENERALIZE_RANGE
-			elif overlap[0][1] == 1:
-				# if new range overlayed with the upper bound of an EC, update the lower bound of new range to the upper bound of existed EC.
-				lb_new = overlap[0][2]
-				ub_new = lb_new + GENERALIZE_RANGE
 			else:
 				raise Exception("Internal Logic Error detected in func generalize().")
-			# run the range asessment again
-			return review_overlap(1)
 
-		# overlap 2 or overlap 1 on each side indicate the available range for creating a new EC is smaller than GENERALIZE_RANGE => extend existing EC instead
-		elif len(overlap) == 2:
-			return False
+		createNewEC = review_overlap(0)
 
+		if createNewEC:
+			pos = self.create_EC(qi, lb_new, ub_new, ecs)
 		else:
-			raise Exception("Internal Logic Error detected in func generalize().")
+			pos = self.extend_EC(qi, overlap[0][0], overlap[1][0], data, ecs)
 
-	createNewEC = review_overlap(0)
+		# return the position of the EC landed within EC_list[qi]
+		return pos
 
-	if createNewEC:
-		pos = create_EC(qi, lb_new, ub_new)
-	else:
-		pos = extend_EC(qi, overlap[0][0], overlap[1][0], data)
 
-	# return the position of the EC landed within EC_list[qi]
-	return pos
 
+	def extend_EC_force(self, qi, sensor_value_qi, ecn):
+		'''
+		Force enlarge an EC to accomodate an QI record immediately
+		'''
 
+		cfg = self.config
 
-def extend_EC_force(qi, sensor_value_qi, ecn):
-	'''
-	Force enlarge an EC to accomodate an QI record immediately
-	'''
+		ecs = self.EC_list[qi]
 
-	global EC_list, EC_alter_log
+		# the EC may already be deprecated by an earlier forced extension, only a live one is revived afterwards
+		was_deprecated = ecs.deprecated[ecn]
+		if not was_deprecated:
+			ecs.deprecate(ecn)
 
-	EC_list[qi][ecn]["deprecated"] = True
+		lb_new = ub_new = 0
 
-	lb_new = ub_new = 0
-	dist = closest_ecn = closest_ecn_alt = -1
+		# find closest nondeprecated EC
+		closest_ecn, closest_ecn_alt = ecs.nearest(sensor_value_qi)
 
-	# find closest nondeprecated EC
-	for ec in EC_list[qi]:
-		if not ec.get("deprecated"):
-			dist_tmp = min( abs(ec.get("ubound") - sensor_value_qi), abs(ec.get("lbound") - sensor_value_qi) )
-			if dist > 0 and dist_tmp < dist:
-				dist = dist_tmp
-				closest_ecn = ec.get("number")
-			elif dist < 0:
-				dist = dist_tmp
-				closest_ecn = ec.get("number")
-			elif dist > 0 and dist == dist_tmp:
-				closest_ecn_alt = ec.get("number")
+		# return a random padding
+		def get_padding():
+			pad = random.random() * cfg.GENERALIZE_RANGE / 3
+			return pad
 
-	# return a random padding
-	def get_padding():
-		pad = random.random() * GENERALIZE_RANGE / 3
-		return pad
+		# check if overlap with existing ECs
+		def review_overlap(ecn):
+			nonlocal lb_new, ub_new
 
-	# check if overlap with existing ECs
-	def review_overlap(ecn):
-		nonlocal lb_new, ub_new
+			change = False
 
-		change = False
-		QIEC = EC_list[qi]
+			# check over the live ECs intersecting the enlarged range
+			for i in ecs.overlapping(lb_new, ub_new):
+				if i == ecn:
+					continue
+				# [...]: existed EC ; |...| new generalized range
+				# | .. [ .. | .. ]
+				if lb_new <= ecs.lbound[i] < ub_new:
+					# if new range overlayed with the lower bound of another EC, update the upper bound of new range to the lower bound of that EC.
+					ub_new = ecs.lbound[i]
+					change = True
 
-		# check over all ECs of the given QI
-		for i in range(len(QIEC)):
-			# if EC deprecated, skip
-			if QIEC[i].get("deprecated") or i == ecn:
-				continue
-			# [...]: existed EC ; |...| new generalized range
-			# | .. [ .. | .. ]
-			if lb_new <= QIEC[i].get("lbound") < ub_new:
-				# if new range overlayed with the lower bound of another EC, update the upper bound of new range to the lower bound of that EC.
-				ub_new = QIEC[i].get("lbound")
-				change = True
+				# [ .. | .. ] .. |
+				elif lb_new <= ecs.ubound[i] < ub_new:
+					# if new range overlayed with the upper bound of another EC, update the lower bound of new range to the upper bound of that EC.
+					lb_new = ecs.ubound[i]
+					change = True
+			return change
 
-			# [ .. | .. ] .. |
-			elif lb_new <= QIEC[i].get("ubound") < ub_new:
-				# if new range overlayed with the upper bound of another EC, update the lower bound of new range to the upper bound of that EC.
-				lb_new = QIEC[i].get("ubound")
-				change = True
-		return change
-
-	# make compromises : publish with "parent node" (does not count as member of the EC)
-	def compromise():
-		global Compromised_range_dict
-
-		# find closest nondeprecated and matured EC
-		dist = closest_ecn = -1
-		for ec in EC_list[qi]:
-			if not ec.get("deprecated") and ec.get("member") > THRESHOLD_K:
-				dist_tmp = min( abs(ec.get("ubound") - sensor_value_qi), abs(ec.get("lbound") - sensor_value_qi) )
-				if dist > 0 and dist_tmp < dist:
-					dist = dist_tmp
-					closest_ecn = ec.get("number")
-				elif dist < 0:
-					dist = dist_tmp
-					closest_ecn = ec.get("number")
-
-		# if no mature EC available (may occur when a new user started)
-		if closest_ecn == -1:
-			Compromised_range_dict[qi] = [EC_list[qi][ecn].get("lbound"), EC_list[qi][ecn].get("ubound")]
-		# if the actual value is higher than the upper bound of the closest mature EC
-		elif sensor_value_qi > EC_list[qi][closest_ecn].get("ubound"):
-			Compromised_range_dict[qi] = [EC_list[qi][closest_ecn].get("lbound"), sensor_value_qi + get_padding()]
-		# else the actual value must be lower than the lower bound of the closest mature EC
-		else:
-			Compromised_range_dict[qi] = [sensor_value_qi - get_padding(), EC_list[qi][closest_ecn].get("ubound")]
+		# make compromises : publish with "parent node" (does not count as member of the EC)
+		def compromise():
+			# find closest nondeprecated and matured EC (ties go to the lowest EC number)
+			closest_ecn = ecs.nearest_mature(sensor_value_qi)
+
+			# if no mature EC available (may occur when a new user started)
+			if closest_ecn == -1:
+				self.Compromised_range_dict[qi] = [ecs.lbound[ecn], ecs.ubound[ecn]]
+			# if the actual value is higher than the upper bound of the closest mature EC
+			elif sensor_value_qi > ecs.ubound[closest_ecn]:
+				self.Compromised_range_dict[qi] = [ecs.lbound[closest_ecn], sensor_value_qi + get_padding()]
+			# else the actual value must be lower than the lower bound of the closest mature EC
+			else:
+				self.Compromised_range_dict[qi] = [sensor_value_qi - get_padding(), ecs.ubound[closest_ecn]]
 
+		# enlarge the target EC to cover the record and let it join
+		def absorb(target):
+			nonlocal lb_new, ub_new
 
-	# if the EC will become a mature one for publishing after this record joins
-	if EC_list[qi][closest_ecn].get("member") >= THRESHOLD_K - 1:
-		# use this EC
-		if sensor_value_qi > EC_list[qi][closest_ecn].get("ubound"):
-			EC_list[qi][closest_ecn]["ubound"] = sensor_value_qi + get_padding()
-			lb_new = EC_list[qi][closest_ecn].get("lbound")
-			ub_new = EC_list[qi][closest_ecn].get("ubound")
+			if sensor_value_qi > ecs.ubound[target]:
+				lb_new = ecs.lbound[target]
+				ub_new = sensor_value_qi + get_padding()
+			else:
+				lb_new = sensor_value_qi - get_padding()
+				ub_new = ecs.ubound[target]
 
-			if review_overlap(closest_ecn):
-				EC_list[qi][closest_ecn]["lbound"] = lb_new
-				EC_list[qi][closest_ecn]["ubound"] = ub_new
-			EC_list[qi][closest_ecn]["member"] += 1
+			# trim the enlarged range against the neighbouring ECs
+			review_overlap(target)
+			ecs.set_bounds(target, lb_new, ub_new)
 
-		else:
-			EC_list[qi][closest_ecn]["lbound"] = sensor_value_qi - get_padding()
-			lb_new = EC_list[qi][closest_ecn].get("lbound")
-			ub_new = EC_list[qi][closest_ecn].get("ubound")
-
-			if review_overlap(closest_ecn):
-				EC_list[qi][closest_ecn]["lbound"] = lb_new
-				EC_list[qi][closest_ecn]["ubound"] = ub_new
-			EC_list[qi][closest_ecn]["member"] += 1
-
-		# record the EC change
-		EC_alter_log[qi] = [ecn, closest_ecn]
-		return closest_ecn
-
-	# check alternative
-	elif closest_ecn_alt != -1:
-		if EC_list[qi][closest_ecn_alt].get("member") >= THRESHOLD_K - 1:
-			# use the alternative EC
-			if sensor_value_qi > EC_list[qi][closest_ecn_alt].get("ubound"):
-				EC_list[qi][closest_ecn_alt]["ubound"] = sensor_value_qi + get_padding()
-				lb_new = EC_list[qi][closest_ecn_alt].get("lbound")
-				ub_new = EC_list[qi][closest_ecn_alt].get("ubound")
+			# the tuples waiting on the EC may become publishable once it matures
+			if ecs.join(target) == cfg.THRESHOLD_K:
+				self.Accumulated_list.mark_waiters(qi, target)
 
-				if review_overlap(closest_ecn_alt):
-					EC_list[qi][closest_ecn_alt]["lbound"] = lb_new
-					EC_list[qi][closest_ecn_alt]["ubound"] = ub_new
-				EC_list[qi][closest_ecn_alt]["member"] += 1
+			# record the EC change
+			self.EC_alter_log[qi] = [ecn, target]
 
-			else:
-				EC_list[qi][closest_ecn_alt]["lbound"] = sensor_value_qi - get_padding()
-				lb_new = EC_list[qi][closest_ecn_alt].get("lbound")
-				ub_new = EC_list[qi][closest_ecn_alt].get("ubound")
+			if self.metrics is not None:
+				self.metrics.count("ec_force_extensions")
+			return target
 
-				if review_overlap(closest_ecn_alt):
-					EC_list[qi][closest_ecn_alt]["lbound"] = lb_new
-					EC_list[qi][closest_ecn_alt]["ubound"] = ub_new
-				EC_list[qi][closest_ecn_alt]["member"] += 1
+		# if the EC will become a mature one for publishing after this record joins
+		if closest_ecn != -1 and ecs.member[closest_ecn] >= cfg.THRESHOLD_K - 1:
+			# use this EC
+			return absorb(closest_ecn)
 
-			# record the EC change
-			EC_alter_log[qi] = [ecn, closest_ecn_alt]
-			return closest_ecn_alt
+		# check alternative
+		elif closest_ecn_alt != -1 and ecs.member[closest_ecn_alt] >= cfg.THRESHOLD_K - 1:
+			# use the alternative EC
+			return absorb(closest_ecn_alt)
 
 		else:
 			# make compromises : publish with "parent node" (does not count as member of the EC)
 			compromise()
+
+			if self.metrics is not None:
+				self.metrics.count("compromises")
 			# revive the deprecated EC
-			EC_list[qi][ecn]["deprecated"] = False
+			if not was_deprecated:
+				ecs.revive(ecn)
 			return -1
-	else:
-		# make compromises : publish with "parent node" (does not count as member of the EC)
-		compromise()
-		# revive the deprecated EC
-		EC_list[qi][ecn]["deprecated"] = False
-		return -1
 		
 
-def _apply_EC_change():
-	'''
-	Apply alternation of EC to other accumulated tuples
-	After EC enlargement, check if other QI entries in accumulated tuples match the new enlarged EC
-	'''
+	def _apply_EC_change(self):
+		'''
+		Apply alternation of EC to other accumulated tuples
+		After EC enlargement, check if other QI entries in accumulated tuples match the new enlarged EC
+		'''
 
-	global Accumulated_list, EC_alter_log
+		# dict EC_alter_log
+		#	{ qi : [original_ec_number, new_ec_number] }
 
-	# dict EC_alter_log
-	#	{ qi : [original_ec_number, new_ec_number] }
+		# only the tuples waiting on the original EC of each QI are touched
+		for qi in self.EC_alter_log:
+			original_ec_number, new_ec_number = self.EC_alter_log[qi]
+			# if the raw value falls in the new enlarged EC range, replace it with the new_ec_number
+			# otherwise remain the original_ec_num
+			# EC change only occurs in non-compromised mode, which means the original EC is deprecated if qi entry exists in EC_alter_log
+			self.Accumulated_list.remap(qi, original_ec_number, new_ec_number, self.EC_list[qi].lbound[new_ec_number], self.EC_list[qi].ubound[new_ec_number])
 
-	if EC_alter_log:
-		
-		for qi in EC_alter_log:
-			for tuples in Accumulated_list:
-				# tuples = [counter, sensor_value, QI_EC_indicator]
-				# QI_EC_indicator = tuples[2]
-				# if QI_EC_indicator[qi] equals to original_ec_number
-				if tuples[2][qi] == EC_alter_log[qi][0]:
-					new_ec_number = EC_alter_log[qi][1]
-					# if the raw value falls in the new enlarged EC range, replace it with the new_ec_number
-					if EC_list[qi][new_ec_number].get("lbound") <= tuples[1][qi] < EC_list[qi][new_ec_number].get("ubound"):
-						tuples[2][qi] = new_ec_number
-					# otherwise remain the original_ec_num
-					# EC change only occurs in non-compromised mode, which means the original EC is deprecated if qi entry exists in EC_alter_log
-					else:
-						pass
+		# clear the change after applying
+		self.EC_alter_log.clear()
 
-	# clear the change after applying
-	EC_alter_log.clear()
 
+	def _flush_tuple(self):
+		'''
+		Immediately publish the longest accumulated tuple and pop it from accumulation queue
+		'''
 
-def _flush_tuple():
-	'''
-	Immediately publish the longest accumulated tuple and pop it from accumulation queue
-	'''
+		cfg = self.config
 
-	global Accumulated_list
+		# flag inidcating if this record needs compromising for publication
+		isCompromisedMode = False
 
-	# flag inidcating if this record needs compromising for publication
-	isCompromisedMode = False
+		# pop the longest accumulated tuple out of accumulation queue
+		tup = self.Accumulated_list.popleft()
 
-	# naming respresentation
-	counter = Accumulated_list[0][0]
-	sensor_value = Accumulated_list[0][1]
-	QI_EC_indicator = Accumulated_list[0][2]
+		# naming respresentation
+		counter = tup[0]
+		sensor_value = tup[1]
+		QI_EC_indicator = tup[2]
 
-	# check all entries in this tuple to see if the EC fitted is ready for publication
-	for qi in QI_POS:
-		# QI_EC_indicator[qi] : EC pos of the QI
-		if EC_list[qi][QI_EC_indicator[qi]].get("member") < THRESHOLD_K or EC_list[qi][QI_EC_indicator[qi]].get("deprecated"):
-			# In order to publish the expiring tuple immediately, extend existed EC for this QI
-			QI_EC_indicator[qi] = extend_EC_force(qi, sensor_value[qi], QI_EC_indicator[qi])
-			if QI_EC_indicator[qi] == -1:
-				isCompromisedMode = True
+		# check all entries in this tuple to see if the EC fitted is ready for publication
+		for qi in cfg.QI_POS:
+			# QI_EC_indicator[qi] : EC pos of the QI
+			if self.EC_list[qi].member[QI_EC_indicator[qi]] < cfg.THRESHOLD_K or self.EC_list[qi].deprecated[QI_EC_indicator[qi]]:
+				# In order to publish the expiring tuple immediately, extend existed EC for this QI
+				QI_EC_indicator[qi] = self.extend_EC_force(qi, sensor_value[qi], QI_EC_indicator[qi])
+				if QI_EC_indicator[qi] == -1:
+					isCompromisedMode = True
 
-	# publish the tuple
-	publish(sensor_value, QI_EC_indicator, isCompromisedMode)
-	# pop the published tuple out of accumulation queue
-	Accumulated_list.pop(0)
-	# apply the modifications of EC to other accumulating tuples
-	_apply_EC_change()
+		# publish the tuple
+		self.publish(sensor_value, QI_EC_indicator, isCompromisedMode)
+		# apply the modifications of EC to other accumulating tuples
+		self._apply_EC_change()
 
 
-def _check_refesh_EC():
-	'''
-	Evaluate the necessity of cluster wipe to prevent overfit and linkage attack
-	'''
+	def _compact_EC(self, qi):
+		'''
+		Drop the deprecated ECs of a QI no accumulated tuple refers to, and renumber the rest
+		'''
+
+		mapping = self.EC_list[qi].compact(self.Accumulated_list.referenced(qi))
+		self.Accumulated_list.renumber(qi, mapping)
+
+		if self.metrics is not None:
+			self.metrics.count("ec_compactions")
+
+
+	def _merge_EC(self, qi):
+		'''
+		Merge the two adjacent live ECs of a QI holding the fewest members (the lowest pair on ties)
+		'''
+
+		ecs = self.EC_list[qi]
+		numbers = ecs.numbers
+		member = ecs.member
+
+		fewest = None
+		for pos in range(len(numbers) - 1):
+			held = member[numbers[pos]] + member[numbers[pos + 1]]
+			if fewest is None or held < fewest:
+				fewest = held
+				ecn, other = numbers[pos], numbers[pos + 1]
+
+		ecs.merge(ecn, other)
+
+		# the tuples waiting on the folded EC now wait on the merged one, and may be publishable with it
+		self.Accumulated_list.remap(qi, other, ecn, ecs.lbound[ecn], ecs.ubound[ecn])
+		if fewest >= self.config.THRESHOLD_K:
+			self.Accumulated_list.mark_waiters(qi, ecn)
+
+		if self.metrics is not None:
+			self.metrics.count("ec_evictions")
+
+
+	def _enforce_caps(self):
+		'''
+		Bounded memory: merge ECs of the QIs holding more than MAX_LIVE_ECS live ones, and publish the oldest tuples beyond MAX_ACCUMULATED
+		'''
+
+		cfg = self.config
+
+		if cfg.MAX_LIVE_ECS:
+			for qi in cfg.QI_POS:
+				while len(self.EC_list[qi].numbers) > cfg.MAX_LIVE_ECS:
+					self._merge_EC(qi)
 
-	global Init_timer
+		if cfg.MAX_ACCUMULATED:
+			evicted = 0
+			while len(self.Accumulated_list) > cfg.MAX_ACCUMULATED:
+				self._flush_tuple()
+				evicted += 1
+
+			if evicted and self.metrics is not None:
+				self.metrics.count("evicted", evicted)
+
+
+	def memory_usage(self):
+		'''
+		Report the accumulated tuples, the live and held ECs of every QI and the approximate bytes of the anonymizer state
+		'''
+
+		cfg = self.config
+
+		with self.lock:
+			usage = {
+				"accumulated": len(self.Accumulated_list),
+				"live_ecs": {qi: len(self.EC_list[qi].numbers) for qi in cfg.QI_POS},
+				"held_ecs": {qi: len(self.EC_list[qi]) for qi in cfg.QI_POS},
+				"bytes": self.Accumulated_list.nbytes() + sum(self.EC_list[qi].nbytes() for qi in cfg.QI_POS),
+			}
+			# the EC generation under warm-up
+			if self.Shadow is not None:
+				usage["bytes"] += self.Shadow[1].nbytes() + sys.getsizeof(self.Shadow[2])
+
+		if self.metrics is not None:
+			self.metrics.set("memory_bytes", usage["bytes"])
+			self.metrics.set("live_ecs", sum(usage["live_ecs"].values()))
+
+		return usage
+
+
+	def _check_refesh_EC(self):
+		'''
+		Evaluate the necessity of cluster wipe to prevent overfit and linkage attack
+		'''
+
+		cfg = self.config
 	
-	# flag indicating if a refresh is to be executed
-	flush_flag = False
-
-	# Check 1 : Timer reached
-	# get current time
-	current_time = time.time()
-
-	if current_time - Init_timer > REFRESH_TIMER:
-		flush_flag = True
-
-	# Check 2 : EC has too many members
-	# for each quasi-identifier
-	for qi in QI_POS:
-		# for ECs of the selected quasi-identifier
-		for ec in EC_list[qi]:
-			if ec.get("member") > EC_MAX_HOLDING_MEMBERS:
+		# flag indicating if a refresh is to be executed
+		flush_flag = False
+
+		# Check 1 : Timer reached
+		# get current time
+		current_time = self.clock.time()
+
+		if current_time - self.Init_timer > cfg.REFRESH_TIMER:
+			flush_flag = True
+
+		# Check 2 : EC has too many members
+		# for each quasi-identifier
+		for qi in cfg.QI_POS:
+			# the running maximum member count of the ECs of the selected quasi-identifier
+			if self.EC_list[qi].peak > cfg.EC_MAX_HOLDING_MEMBERS:
 				flush_flag = True
+
+		# rolling refresh: a new generation is already on its way
+		if cfg.REFRESH_WARMUP and (self.Shadow is not None or self.Refresh_queue):
+			# the current ECs keep serving meanwhile, but none may take a member beyond the EC_MAX_HOLDING_MEMBERS + 1 a wipe allows
+			if not any(self.EC_list[qi].peak > cfg.EC_MAX_HOLDING_MEMBERS + 1 for qi in cfg.QI_POS):
+				self._roll_generation()
+				return
+
+			# give up the warm-up and wipe all ECs at once
+			if self.metrics is not None:
+				self.metrics.count("generation_aborts")
+			self.drain()
+			self.sink.flush()
+			self.initialize()
+			return
 		
 	
-	if flush_flag:
-		if EXPERIMENT_MODE:
-			print("############## Refresh ##############")
+		if flush_flag:
+			if self.experiment_mode:
+				print("############## Refresh ##############")
 
-		# force output all tuples accumulated
-		while Accumulated_list:
-			_flush_tuple()
+			if self.metrics is not None:
+				self.metrics.count("refreshes")
 
-		# wipe all ECs and reset timer
-		initialize()
+			if cfg.REFRESH_WARMUP:
+				# renew the QIs one after the other, the fullest first, while the current ECs keep serving
+				self.Refresh_queue = sorted(cfg.QI_POS, key=lambda qi: -self.EC_list[qi].peak)
+				self.Init_timer = current_time
+				self._roll_generation()
+				return
 
+			# force output all tuples accumulated
+			self.drain()
+			self.sink.flush()
 
+			# wipe all ECs and reset timer
+			self.initialize()
 
-def _tuple_delay_update(latest_counter):
-	'''
-	Check timeout for accumulated tuples
-	'''
 
-	global Accumulated_list
+	def _warm_shadow(self, sensor_value):
+		'''
+		Let the new EC generation under warm-up learn an incoming tuple, return its EC number in the new generation
+		'''
+
+		qi, ecs, ecns, remaining = self.Shadow
+
+		ecn = ecs.find(sensor_value[qi])
+		if ecn == -1:
+			ecn = self.generalize(qi, sensor_value[qi], ecs)
+		else:
+			ecs.join(ecn)
+
+		self.Shadow[3] = remaining - 1
+		return ecn
+
+
+	def _roll_generation(self):
+		'''
+		Rolling refresh step: start warming up the next QI, or swap in the new generation of a QI once warmed up
+		'''
+
+		if self.Shadow is None:
+			self.Shadow = [self.Refresh_queue.pop(0), ECStore(self.config.THRESHOLD_K + 1), {}, self.config.REFRESH_WARMUP]
+			return
+
+		qi, ecs, ecns, remaining = self.Shadow
+		if remaining > 0:
+			return
+
+		# the tuples accumulated before the warm-up have no EC in the new generation, publish them with the current one
+		while self.Accumulated_list and self.Accumulated_list.head()[4] not in ecns:
+			self._flush_tuple()
+
+		# the warm-up tuples were published under the current generation: only those still queued are published under the new ranges,
+		# so only they count as members of the new ECs
+		ecs.clear_members()
+		for key in self.Accumulated_list.entries:
+			ecs.join(ecns[key])
+
+		self.EC_list[qi] = ecs
+		self.Accumulated_list.rebind(qi, ecns)
+		self.Shadow = None
+
+		if self.metrics is not None:
+			self.metrics.count("generation_swaps")
+
+
+	def drain(self):
+		'''
+		Force output all tuples accumulated
+		'''
+
+		with self.lock:
+			while self.Accumulated_list:
+				self._flush_tuple()
+
+
+	def close(self):
+		'''
+		Publish all tuples accumulated and close the sink
+		'''
+
+		self.drain()
+		self.sink.close()
+
+
+
+	def refresh_headroom(self):
+		'''
+		Report how many more members the fullest EC of each QI takes before all ECs are wiped
+		'''
+
+		cfg = self.config
+
+		return {qi: cfg.EC_MAX_HOLDING_MEMBERS - self.EC_list[qi].peak for qi in cfg.QI_POS}
+
+
+	def _tuple_delay_update(self, latest_counter):
+		'''
+		Check timeout for accumulated tuples
+		'''
+
+		cfg = self.config
+
+		# if there are tuples accumulating
+		if self.Accumulated_list:
+			# get the counter of the longest accumulated tuple
+			counter = self.Accumulated_list.head()[0]
+
+			# if about to overtime, update the delay tolerance of accumulated tuples
+			if counter <= latest_counter - cfg.ACCUMULATION_DELAY_TOLERANCE:
+				self._flush_tuple()
+
+				if self.metrics is not None:
+					self.metrics.count("expired")
 
-	# if there are tuples accumulating
-	if Accumulated_list:
-		# get the counter of the longest accumulated tuple
-		counter = Accumulated_list[0][0]
+			# evaluate if the accumulated tuples whose ECs matured or changed are ready to publish
+			self._publish_ready()
 
-		# if about to overtime, update the delay tolerance of accumulated tuples
-		if counter <= latest_counter - ACCUMULATION_DELAY_TOLERANCE:
-			_flush_tuple()
+		return
 
-		# evaluate if other accumulated tuples are ready to publish 
-		for tup in Accumulated_list:
+
+	def _publish_ready(self):
+		'''
+		Publish the accumulated tuples scheduled for re-evaluation whose ECs are all mature
+		'''
+
+		cfg = self.config
+
+		for tup in self.Accumulated_list.take_pending():
 			ready = True
-			for qi in QI_POS:
+			for qi in cfg.QI_POS:
 				# tup[2][qi] : EC pos of the QI
-				if EC_list[qi][tup[2][qi]].get("member") < THRESHOLD_K or EC_list[qi][tup[2][qi]].get("deprecated"):
+				if self.EC_list[qi].member[tup[2][qi]] < cfg.THRESHOLD_K or self.EC_list[qi].deprecated[tup[2][qi]]:
 					ready = False
+					break
 
 			if ready:
-				publish(tup[1], tup[2], False)
-				try:
-					Accumulated_list.remove(tup)
-				except ValueError: # internal error
-					raise Exception("Internal Logic Error detected in func _tuple_delay_update().")
+				self.Accumulated_list.remove(tup)
+				self.publish(tup[1], tup[2], False)
 
-	return
 
+	def expire(self, now=None):
+		'''
+		Publish every accumulated tuple whose deadline (ACCUMULATION_DELAY_TOLERANCE * SENSOR_FREQUENCY seconds after arrival) passed
+		Return the deadline of the next tuple to expire, or None if no tuple is accumulated
+		'''
 
-def process(counter, sensor_value):
-	'''
-	The core processing procedure for incoming tuples (root of all functions)
-	Runs the logic loop
-	'''
+		with self.lock:
+			if now is None:
+				now = self.clock.time()
+
+			expired = 0
+			while self.Accumulated_list and self.Accumulated_list.head()[3] <= now:
+				self._flush_tuple()
+				expired += 1
 
-	global Accumulated_list
+			if expired:
+				if self.metrics is not None:
+					self.metrics.count("expired", expired)
+				# the forced extensions may have matured the ECs of other tuples
+				self._publish_ready()
+				self.sink.flush()
 
-	# the list for indicating which EC in EC_list does each QI fall in
-	QI_EC_indicator = []
-	for i in range(max(QI_POS) + 1):
-		# default -1: no EC
-		QI_EC_indicator.append("-1")
+			return self.Accumulated_list.head()[3] if self.Accumulated_list else None
 
-	# flag indicating if the QI values could be accommodated by any EC
-	fitEC = False
 
-	# flag indicating if the tuple needs to be accumulated
-	toAccumulate = False
+	def process(self, counter, sensor_value, hint=None):
+		'''
+		The core processing procedure for incoming tuples (root of all functions)
+		hint optionally maps each QI to a [ECStore, EC number] looked up ahead of time (see process_batch())
+		'''
 
-	# flag indicating if any QI does not satisfy privacy threshold
-	notSatisfied = False
+		with self.lock:
+			self._process(counter, sensor_value, hint)
 
-	# go over each quasi-identifier
-	for qi in QI_POS:
-		# refresh flag for each quasi-identifier
+
+	def _process(self, counter, sensor_value, hint):
+		'''
+		Runs the logic loop of process()
+		'''
+
+		cfg = self.config
+
+		# stage timings, only taken with metrics enabled
+		metrics = self.metrics
+		if metrics is not None:
+			t_start = time.perf_counter()
+
+		# rolling refresh: the next EC generation learns the tuple too
+		# EC number of the tuple in the new generation under warm-up
+		shadow_ecn = None
+		if self.Shadow is not None:
+			shadow_ecn = self._warm_shadow(sensor_value)
+
+		# the slots indicating which EC in EC_list does each QI fall in (default -1: no EC)
+		QI_EC_indicator = self.schema.indicator[:]
+
+		# flag indicating if the QI values could be accommodated by any EC
 		fitEC = False
 
-		# for ECs of the selected quasi-identifier
-		for ec in EC_list[qi]:
-			# if there are already matched EC satisfying privacy condition
-			if ec.get("lbound") <= sensor_value[qi] and ec.get("ubound") > sensor_value[qi] and not ec.get("deprecated") :
+		# flag indicating if the tuple needs to be accumulated
+		toAccumulate = False
+
+		# flag indicating if any QI does not satisfy privacy threshold
+		notSatisfied = False
+
+		# go over each quasi-identifier
+		for qi in cfg.QI_POS:
+			# refresh flag for each quasi-identifier
+			fitEC = False
+
+			# look up the live EC covering the value
+			ecs = self.EC_list[qi]
+			if hint is None:
+				ecn = ecs.find(sensor_value[qi])
+			else:
+				hint_ecs, ecn = hint[qi]
+				# the EC looked up ahead must still exist and be live and cover the value (live ECs never overlap, so it is the only one)
+				# a compaction meanwhile renumbers the same store, the number may then be past its end or name another EC
+				if hint_ecs is not ecs or ecn == -1 or ecn >= len(ecs) or ecs.deprecated[ecn] or not ecs.lbound[ecn] <= sensor_value[qi] < ecs.ubound[ecn]:
+					ecn = ecs.find(sensor_value[qi])
+			if ecn != -1:
 				# record the serial number of the EC
-				QI_EC_indicator[qi] = ec.get("number")
+				QI_EC_indicator[qi] = ecn
 				# one new tuple joining the EC
-				ec["member"] += 1
+				# the tuples waiting on the EC may become publishable once it matures
+				if self.EC_list[qi].join(ecn) == cfg.THRESHOLD_K:
+					self.Accumulated_list.mark_waiters(qi, ecn)
 				# successfully fits an EC
 				fitEC = True
 					
-		# when no EC could accommodate this QI value
-		if not fitEC:
-			# create a new EC or extend existed EC based on the new generalized range
-			ec_pos = generalize(qi, sensor_value[qi])
-			# record the serial number of the EC
-			QI_EC_indicator[qi] = ec_pos
-			# if new EC created, the tuple definitely needs to be accumulated (until the EC has more than THRESHOLD_K members)
-			toAccumulate = True
-
-	#debug
-	#print(EC_list)
+			# when no EC could accommodate this QI value
+			if not fitEC:
+				# create a new EC or extend existed EC based on the new generalized range
+				ec_pos = self.generalize(qi, sensor_value[qi])
+				# record the serial number of the EC
+				QI_EC_indicator[qi] = ec_pos
+				# if new EC created, the tuple definitely needs to be accumulated (until the EC has more than THRESHOLD_K members)
+				toAccumulate = True
+
+		#debug
+		#print(self.EC_list)
+
+		if metrics is not None:
+			t_lookup = time.perf_counter()
+			metrics.observe("process_lookup", t_lookup - t_start)
 	
-	# for each QI position in the raw input tuple
-	for n in QI_POS:
-		if QI_EC_indicator[n] == "-1":
-			raise Exception("Internal Logic Error detected in func process().")
-		elif EC_list[n][QI_EC_indicator[n]].get("member") < THRESHOLD_K:
-			toAccumulate = True
-			break
+		# for each QI position in the raw input tuple
+		for n in cfg.QI_POS:
+			if QI_EC_indicator[n] == -1:
+				raise Exception("Internal Logic Error detected in func process().")
+			elif self.EC_list[n].member[QI_EC_indicator[n]] < cfg.THRESHOLD_K:
+				toAccumulate = True
+				break
+
+		if toAccumulate:
+			# the tuple must be published within its delay budget, also when no further tuple arrives (see expire())
+			deadline = self.clock.time() + cfg.ACCUMULATION_DELAY_TOLERANCE * cfg.SENSOR_FREQUENCY
+			tup = [counter, sensor_value, QI_EC_indicator, deadline, None]
+			key = self.Accumulated_list.append(tup)
+			# published with the new generation if still accumulated at the swap
+			if shadow_ecn is not None:
+				self.Shadow[2][key] = shadow_ecn
+			# the tuple may land in mature ECs through EC extension, evaluate it with the others
+			self.Accumulated_list.mark(tup)
+		else:
+			self.publish(sensor_value, QI_EC_indicator, False)
+
+		if metrics is not None:
+			t_publish = time.perf_counter()
+			metrics.observe("process_publish", t_publish - t_lookup)
+			if toAccumulate:
+				metrics.count("accumulated")
+
+
+		# check the necessity of refeshing ECs
+		self._check_refesh_EC()
+
+		# bounded memory mode
+		if cfg.MAX_LIVE_ECS or cfg.MAX_ACCUMULATED:
+			self._enforce_caps()
+
+		if metrics is not None:
+			t_refresh = time.perf_counter()
+			metrics.observe("process_refresh_check", t_refresh - t_publish)
 
-	if toAccumulate:
-		Accumulated_list.append([counter, sensor_value, QI_EC_indicator])
-	else:
-		publish(sensor_value, QI_EC_indicator, False)
+		# process tuples accumulated overtime
+		self._tuple_delay_update(counter)
 
+		if metrics is not None:
+			metrics.observe("process_delay_update", time.perf_counter() - t_refresh)
+			metrics.count("processed")
+			metrics.set("accumulation_queue_depth", len(self.Accumulated_list))
 
-	# check the necessity of refeshing ECs
-	_check_refesh_EC()
+		# drop the deprecated ECs once they make up too much of a QI
+		for qi in cfg.QI_POS:
+			ecs = self.EC_list[qi]
+			if len(ecs) >= COMPACTION_MIN_ECS and len(ecs) - len(ecs.numbers) > cfg.COMPACTION_THRESHOLD * len(ecs):
+				self._compact_EC(qi)
 
-	# process tuples accumulated overtime
-	_tuple_delay_update(counter)
+		# the tuple is done with: a snapshot from here on resumes with the next one
+		self.tuple_counter = counter + 1
+
+		# periodic checkpoint
+		if self.checkpoint_path is not None and self.clock.time() - self.last_checkpoint >= self.checkpoint_interval:
+			self.checkpoint(self.checkpoint_path)
+	
 	
+
+	def process_batch(self, rows, counter=None, chunk_size=1024):
+		'''
+		Process a batch of tuples, with the same output as feeding the rows one by one through process()
+		EC lookup runs vectorized per chunk of rows, only the rows whose EC changed meanwhile are looked up again
+		'''
+
+		cfg = self.config
+
+		if counter is None:
+			counter = self.tuple_counter
+
+		for start in range(0, len(rows), chunk_size):
+			chunk = rows[start:start + chunk_size]
+
+			# look up every QI value of the chunk against the current ECs
+			hints = {}
+			for qi in cfg.QI_POS:
+				ecs = self.EC_list[qi]
+				if numpy is not None and isinstance(chunk, numpy.ndarray):
+					values = chunk[:, qi]
+				else:
+					values = [row[qi] for row in chunk]
+				hints[qi] = [[ecs, ecn] for ecn in ecs.find_many(values)]
+
+			for i in range(len(chunk)):
+				row = chunk[i]
+				sensor_value = row.tolist() if numpy is not None and isinstance(row, numpy.ndarray) else row
+				# EXPERIMENT_MODE: attach the arrival timestamp, removed later in publish(), without touching the caller's row
+				if self.experiment_mode:
+					sensor_value = list(sensor_value)
+					sensor_value.append(self.clock.time())
+				self.process(counter, sensor_value, {qi: hints[qi][i] for qi in cfg.QI_POS})
+				counter += 1
+
+
+	def setExperimentMode(self):
+		'''
+		Only for experiments used in research paper 
+		'''
+
+		self.experiment_mode = True
+
+
+	def get_state(self):
+		'''
+		Return the anonymizer state (ECs, accumulated tuples, timers, counters) as a picklable dict
+		'''
+
+		cfg = self.config
+
+		return {
+			"version": CHECKPOINT_VERSION,
+			"QI_POS": list(cfg.QI_POS),
+			"ID_POS": list(cfg.ID_POS),
+			"EC_list": self.EC_list,
+			# the tuples in deadline order, the waiter index is rebuilt from them
+			"Accumulated_list": list(self.Accumulated_list),
+			"pending": list(self.Accumulated_list.pending),
+			"seq": self.Accumulated_list.seq,
+			"Compromised_range_dict": self.Compromised_range_dict,
+			"Shadow": self.Shadow,
+			"Refresh_queue": self.Refresh_queue,
+			"Init_timer": self.Init_timer,
+			"Last_arrival_time": self.Last_arrival_time,
+			"tuple_counter": self.tuple_counter,
+		}
+
+
+	def set_state(self, state):
+		'''
+		Take over an anonymizer state returned by get_state()
+		'''
+
+		cfg = self.config
+
+		if state.get("version") != CHECKPOINT_VERSION or state["QI_POS"] != list(cfg.QI_POS) or state["ID_POS"] != list(cfg.ID_POS):
+			raise Exception("Error: Checkpoint does not match the configuration.")
+
+		# built aside, then swapped in at once under the lock (the DeadlineScheduler thread may be expiring tuples)
+		accumulated = AccumulationQueue(cfg.QI_POS)
+		# the tuples keep their keys, the pending ones and the Shadow refer to them
+		for tup in state["Accumulated_list"]:
+			accumulated.seq = tup[4]
+			accumulated.append(tup)
+		accumulated.seq = state["seq"]
+		for key in state["pending"]:
+			accumulated.mark(accumulated.entries[key])
+
+		with self.lock:
+			self.EC_list = state["EC_list"]
+			self.Accumulated_list = accumulated
+
+			self.Compromised_range_dict = state["Compromised_range_dict"]
+			self.EC_alter_log = {}
+			self.Shadow = state["Shadow"]
+			self.Refresh_queue = state["Refresh_queue"]
+			self.Init_timer = state["Init_timer"]
+			self.Last_arrival_time = state["Last_arrival_time"]
+			self.tuple_counter = state["tuple_counter"]
+			# the restored timers already run on the time of the tuples
+			self.clock_anchored = True
+
+
+	def checkpoint(self, path):
+		'''
+		Snapshot the anonymizer state to a file (replaced atomically)
+		The sink is flushed first, so the published output is durable up to the snapshot
+		'''
+
+		with self.lock:
+			self.sink.flush()
+			_atomic_dump(self.get_state(), path)
+			self.last_checkpoint = self.clock.time()
+
+
+	def restore(self, path):
+		'''
+		Warm start from a checkpoint file written by checkpoint(), return False if there is none
+		Tuples fed after the snapshot (tuple_counter onwards) are to be fed again
+		Only restore checkpoints written by this process' owner (pickle)
+		'''
+
+		try:
+			with open(path, "rb") as f:
+				state = pickle.load(f)
+		except FileNotFoundError:
+			return False
+
+		self.set_state(state)
+		return True
+
+
+	def setCheckpoint(self, path, interval=60):
+		'''
+		Snapshot the anonymizer state to a file every interval seconds (None path: stop)
+		'''
+
+		self.checkpoint_path = path
+		self.checkpoint_interval = interval
+		self.last_checkpoint = self.clock.time()
+
+
+	def setSink(self, sink):
+		'''
+		Replace the destination of the published records, flushing the former one
+		'''
+
+		self.sink.flush()
+		self.sink = sink
+
+
+	def advance_clock(self, timestamp):
+		'''
+		Move the clock to the arrival time of a tuple (a VirtualClock only moves forward, the wall clock by itself)
+		The timers started before the first timestamp (at 0 on a fresh VirtualClock) restart from it, rather than expiring at once
+		'''
+
+		self.clock.advance_to(timestamp)
+
+		if not self.clock_anchored:
+			self.clock_anchored = True
+			now = self.clock.time()
+			self.Init_timer = now
+			self.last_checkpoint = now
+
+
+	def stream_input_file(self, filepath, timestamp_pos=None, on_error=None):
+		'''
+		Simulate inputs by reading tuples one by one from a given file
+		Desgined for experiments in research paper
+		Tuples arrive one second apart, or as recorded in the timestamp_pos column (seconds) if given
+		Malformed rows are skipped and reported to on_error(line number, line, reason) (see read_tuples())
+		'''
+
+		cfg = self.config
+
+		# init session state
+		self.initialize()
+
+		self.tuple_counter = 0
+		last_timestamp = None
+
+		try:
+			for line_numbers, rows in read_tuples(filepath, cfg, on_error=on_error, timestamp_pos=timestamp_pos):
+				for line_no, tup in zip(line_numbers, rows):
+
+					# sleep to simulate actual sensor routines (a VirtualClock only moves its time)
+					if timestamp_pos is None:
+						if last_timestamp is not None:
+							self.clock.sleep(1)
+						last_timestamp = 0
+					else:
+						timestamp = tup[timestamp_pos]
+						if last_timestamp is not None and timestamp > last_timestamp:
+							self.clock.sleep(timestamp - last_timestamp)
+						last_timestamp = timestamp
+						self.advance_clock(timestamp)
+
+					# in order to evaluate average delay of tuple anonymization, attach arrival timestamp to raw data
+					# remove later in publish() function
+					if self.experiment_mode:
+						tup.append(self.clock.time())
+
+					# process incoming tuple (advances the counter)
+					counter = self.tuple_counter
+					self.process(counter, tup)
+
+					print("Syslog: Finish reading line ", line_no)
+				
+					if self.experiment_mode:
+						print("tup counter: ", counter)
+						print("======== EC_list ========")
+						print(self.EC_list)
+						print("=========================")
+						if counter == 420:
+							input("** Execution halted: 420th tuple processed! **")
+
+		finally:
+			self.sink.flush()
+
+
+	def process_file(self, filepath, on_error=None, chunk_bytes=1 << 22):
+		'''
+		Backfill: process every tuple of an input file at full speed, in batches of one chunk
+		Malformed rows are skipped and reported to on_error(line number, line, reason) (see read_tuples())
+		'''
+
+		try:
+			for line_numbers, rows in read_tuples(filepath, self.config, chunk_bytes, on_error):
+				self.process_batch(rows)
+		finally:
+			self.sink.flush()
+
+
+
+	def stream_input(self, sensor_tuple, timestamp=None):
+		'''
+		The function to call for actual medical devices
+		Call the function for each data tuple collected by body sensors
+		timestamp optionally gives the arrival time of the tuple (seconds), to which a VirtualClock is advanced
+		'''
+
+		cfg = self.config
+
+		## The following lines MUST BE CALLED in program using this framework BEFORE ever calling stream_input(data_tuple)
+		# read_config()
+		# initialize()
 	
+		try:
+			if timestamp is not None:
+				self.advance_clock(timestamp)
+
+			if self.Last_arrival_time is None:
+				self.Last_arrival_time = self.clock.time()
+			else:
+				now = self.clock.time()
+				if now - self.Last_arrival_time < cfg.SENSOR_FREQUENCY:
+					raise Exception("Error: Irregular traffic detected. (Potential DoS)")
+				else:
+					self.Last_arrival_time = now
+
+			# split data and interpret QI fields
+			tup = parse_tuple(sensor_tuple, cfg.QI_POS)
+
+			if self.experiment_mode:
+				tup.append(self.clock.time())
+
+			# process incoming tuple (advances the counter)
+			self.process(self.tuple_counter, tup)
+
+			print("Syslog: Finish reading line ", sensor_tuple)
+
+		except (ValueError, SyntaxError):
+			raise Exception("Error: Invalid input information detected.")
+
+
+
+class DeadlineScheduler:
+	'''
+	Background thread publishing the accumulated tuples of a Session (or of every session of a SessionManager) once their deadline passed
+	Keeps the publication latency bound while the sensors are quiet, where process() only expires tuples on arrival
+	Records are then published from the scheduler thread: sinks shared between sessions must be thread-safe (MemorySink and BufferedFileSink are)
+	'''
+
+	def __init__(self, target):
+		self.target = target
+		self.stopped = threading.Event()
+		self.thread = None
+
+	def _sessions(self):
+		if isinstance(self.target, SessionManager):
+			return list(self.target.sessions.values())
+		return [self.target]
+
+	def _run(self):
+		while not self.stopped.is_set():
+			# a tuple accumulated from now on expires one delay budget later at the earliest
+			cfg = self.target.config
+			wait = cfg.ACCUMULATION_DELAY_TOLERANCE * cfg.SENSOR_FREQUENCY
+			for session in self._sessions():
+				deadline = session.expire()
+				if deadline is not None:
+					wait = min(wait, deadline - session.clock.time())
+			self.stopped.wait(max(wait, 0.001))
+
+	def start(self):
+		self.stopped.clear()
+		self.thread = threading.Thread(target=self._run, name="DeadlineScheduler", daemon=True)
+		self.thread.start()
+
+	def stop(self):
+		self.stopped.set()
+		if self.thread is not None:
+			self.thread.join()
+			self.thread = None
+
+	def __enter__(self):
+		self.start()
+		return self
+
+	def __exit__(self, *exc):
+		self.stop()
+
+
+
+class SessionManager:
+	'''
+	Multiplex the anonymizer sessions of many streams (e.g. patient devices) within one process
+	Sessions are created on first use of a stream id and share one Config
+	Without on_publish or a sink, only the last DEFAULT_SINK_MAXLEN published records are kept in memory
+	'''
+
+	def __init__(self, config=None, on_publish=None, sink=None, clock=None, metrics=None):
+		self.config = config if config is not None else Config()
+		# time source shared by the sessions
+		self.clock = clock if clock is not None else Clock()
+		# Metrics aggregated over the sessions, gauges show the session that processed the last tuple (None: disabled)
+		self.metrics = metrics
+		# callable receiving (stream id, record) for every record published by any session
+		self.on_publish = on_publish
+		# Sink shared by the sessions otherwise (records of all streams interleaved, by default the last DEFAULT_SINK_MAXLEN kept in memory)
+		self.sink = sink if sink is not None else MemorySink(DEFAULT_SINK_MAXLEN)
+		# stream id -> Session
+		self.sessions = {}
+
+	def __len__(self):
+		return len(self.sessions)
+
+	def __contains__(self, stream_id):
+		return stream_id in self.sessions
+
+	def __iter__(self):
+		return iter(self.sessions)
+
+	def session(self, stream_id):
+		'''
+		Return the session of a stream, creating it on first use
+		'''
+		session = self.sessions.get(stream_id)
+		if session is None:
+			sink = self.sink
+			if self.on_publish is not None:
+				sink = CallbackSink(functools.partial(self.on_publish, stream_id))
+			session = self.sessions[stream_id] = Session(self.config, sink, self.clock, self.metrics)
+		return session
+
+	def process(self, stream_id, counter, sensor_value):
+		'''
+		Feed a parsed tuple to the session of a stream
+		'''
+		self.session(stream_id).process(counter, sensor_value)
+
+	def stream_input(self, stream_id, sensor_tuple, timestamp=None):
+		'''
+		Feed a raw tuple to the session of a stream
+		'''
+		self.session(stream_id).stream_input(sensor_tuple, timestamp)
+
+	def refresh(self):
+		'''
+		Publish all accumulated tuples and wipe the ECs of every session
+		'''
+		for session in self.sessions.values():
+			with session.lock:
+				session.drain()
+				session.initialize()
+		self.flush()
+
+	def close(self, stream_id):
+		'''
+		Publish all tuples still accumulated by a stream and drop its session
+		'''
+		session = self.sessions.pop(stream_id)
+		session.drain()
+		session.sink.flush()
+
+	def checkpoint(self, path):
+		'''
+		Snapshot the state of every session to one file (replaced atomically)
+		'''
+		self.flush()
+
+		states = {}
+		for stream_id, session in self.sessions.items():
+			# copied under the lock: the DeadlineScheduler thread may be expiring tuples of the session meanwhile
+			with session.lock:
+				states[stream_id] = copy.deepcopy(session.get_state())
+		_atomic_dump(states, path)
+
+	def restore(self, path):
+		'''
+		Recreate the sessions of a file written by checkpoint(), return False if there is none
+		'''
+		try:
+			with open(path, "rb") as f:
+				states = pickle.load(f)
+		except FileNotFoundError:
+			return False
+
+		for stream_id, state in states.items():
+			self.session(stream_id).set_state(state)
+		return True
+
+	def memory_usage(self):
+		'''
+		Report the memory usage of every session (see Session.memory_usage())
+		'''
+		return {stream_id: session.memory_usage() for stream_id, session in self.sessions.items()}
+
+	def flush(self):
+		'''
+		Flush the sinks of every session
+		'''
+		self.sink.flush()
+		for session in self.sessions.values():
+			session.sink.flush()
+
+	def close_all(self):
+		'''
+		Close every session and the shared sink
+		'''
+		for stream_id in list(self.sessions):
+			self.close(stream_id)
+		self.sink.close()
+
+
+
+##! Module-level API, backed by a default session
+
+_default_session = Session()
+
+
+def read_config():
+	'''
+	Load the configuration from config.ini
+	'''
+
+	_default_session.read_config()
+
+
+def initialize():
+	'''
+	Initialize global variables
+	'''
+
+	_default_session.initialize()
+
+
+def process(counter, sensor_value):
+	'''
+	The core processing procedure for incoming tuples
+	'''
+
+	_default_session.process(counter, sensor_value)
+
+
+def process_batch(rows):
+	'''
+	Process a batch of tuples (same output as process() row by row)
+	'''
+
+	_default_session.process_batch(rows)
+
+
+def refresh_headroom():
+	'''
+	Report how many more members the fullest EC of each QI takes before all ECs are wiped
+	'''
+
+	return _default_session.refresh_headroom()
+
 
 def setExperimentMode():
 	'''
 	Only for experiments used in research paper 
 	'''
 
-	global EXPERIMENT_MODE
+	_default_session.setExperimentMode()
 
-	EXPERIMENT_MODE = True
+
+def checkpoint(path):
+	'''
+	Snapshot the anonymizer state to a file
+	'''
+
+	_default_session.checkpoint(path)
 
 
-def stream_input_file(filepath):
+def restore(path):
 	'''
-	Simulate inputs by reading tuples one by one from a given file
-	Desgined for experiments in research paper
+	Warm start from a checkpoint file, return False if there is none
 	'''
 
-	# load config
-	read_config()
+	return _default_session.restore(path)
 
-	# init global variables
-	initialize()
 
-	# do parser
-	try:
+def setCheckpoint(path, interval=60):
+	'''
+	Snapshot the anonymizer state to a file every interval seconds
+	'''
 
-		with open(filepath) as f:
-			tuple_counter = 0
+	_default_session.setCheckpoint(path, interval)
 
-			for sensor_tuple in f:
 
-				# interpret string
-				#tup = ast.literal_eval(sensor_tuple)
-				
-				# split data and strip whitespace
-				tup = [x.strip() for x in sensor_tuple.split(',')]
+def setMetrics(metrics):
+	'''
+	Enable the hot path instrumentation with a Metrics (None disables it)
+	'''
 
-				
-				# check if the interpreted data is a list
-				if not isinstance(tup, list):
-					raise SyntaxError
+	_default_session.metrics = metrics
 
-				# designated quasi-identifier position is out of list range
-				if max(QI_POS) > len(tup) - 1:
-					raise SyntaxError
-				
-				# interpret QI fields as float numbers
-				for qi in QI_POS:
-					tup[qi] = float(tup[qi])
 
-				# in order to evaluate average delay of tuple anonymization, attach arrival timestamp to raw data
-				# remove later in publish() function
-				if EXPERIMENT_MODE:
-					tup.append(time.time())
+def setClock(clock):
+	'''
+	Replace the time source (full-speed replay: setClock(VirtualClock()))
+	'''
 
-				# process incoming tuple
-				process(tuple_counter, tup)
+	_default_session.clock = clock
 
-				print("Syslog: Finish reading line ", sensor_tuple)
-				
-				if EXPERIMENT_MODE:
-					print("tup counter: ", tuple_counter)
-					print("======== EC_list ========")
-					print(EC_list)
-					print("=========================")
-					if tuple_counter == 420:
-						input("** Execution halted: 420th tuple processed! **")
 
-				# incremental counter
-				tuple_counter += 1
+def memory_usage():
+	'''
+	Report the accumulated tuples, the ECs of every QI and the approximate bytes of the anonymizer state
+	'''
+
+	return _default_session.memory_usage()
 
-				# sleep to simulate actual sensor routines	
-				time.sleep(1)
 
-	except (ValueError, SyntaxError):
-		raise Exception("Error: Invalid input information detected.")
+def setSink(sink):
+	'''
+	Replace the destination of the published records (console output: setSink(ConsoleSink()))
+	Until set, only the last DEFAULT_SINK_MAXLEN published records are kept in memory
+	'''
 
+	_default_session.setSink(sink)
 
 
-def stream_input(sensor_tuple):
+def stream_input_file(filepath, timestamp_pos=None, on_error=None):
 	'''
-	The function to call for actual medical devices
-	Call the function for each data tuple collected by body sensors
+	Simulate inputs by reading tuples one by one from a given file
+	Desgined for experiments in research paper
 	'''
 
-	## The following lines MUST BE CALLED in program using this framework BEFORE ever calling stream_input(data_tuple)
-	# read_config()
-	# initialize()
-	
-	global Last_arrival_time, SENSOR_FREQUENCY
+	# load config
+	read_config()
 
-	try:
-		if Last_arrival_time == 0:
-			Last_arrival_time = time.time()
-		else:
-			now = time.time()
-			if now - Last_arrival_time < SENSOR_FREQUENCY:
-				raise Exception("Error: Irregular traffic detected. (Potential DoS)")
-			else:
-				Last_arrival_time = now
+	_default_session.stream_input_file(filepath, timestamp_pos, on_error)
 
-		# split data and strip whitespace
-		tup = [x.strip() for x in sensor_tuple.split(',')]
 
-		
-		# check if the interpreted data is a list
-		if not isinstance(tup, list):
-			raise SyntaxError
+def process_file(filepath, on_error=None):
+	'''
+	Backfill: process every tuple of an input file at full speed
+	'''
 
-		# designated quasi-identifier position is out of list range
-		if max(QI_POS) > len(tup) - 1:
-			raise SyntaxError
-		
-		# interpret QI fields as float numbers
-		for qi in QI_POS:
-			tup[qi] = float(tup[qi])
+	_default_session.process_file(filepath, on_error)
 
 
-		if EXPERIMENT_MODE:
-			tup.append(time.time())
+def stream_input(sensor_tuple, timestamp=None):
+	'''
+	The function to call for actual medical devices
+	Call the function for each data tuple collected by body sensors
+	'''
 
-		# process incoming tuple
-		process(tuple_counter, tup)
+	## The following lines MUST BE CALLED in program using this framework BEFORE ever calling stream_input(data_tuple)
+	# read_config()
+	# initialize()
 
-		print("Syslog: Finish reading line ", sensor_tuple)
+	_default_session.stream_input(sensor_tuple, timestamp)
 
-		# incremental counter
-		tuple_counter += 1
 
-	except (ValueError, SyntaxError):
-		raise Exception("Error: Invalid input information detected.")
\ No newline at end of file
+def __getattr__(name):
+	# the former module globals (configuration and state) and the remaining functions map to the default session
+	if name == "EXPERIMENT_MODE":
+		return _default_session.experiment_mode
+	if name.isupper() and hasattr(_default_session.config, name):
+		return getattr(_default_session.config, name)
+	if not name.startswith("__") and hasattr(_default_session, name):
+		return getattr(_default_session, name)
+	raise AttributeError("module %r has no attribute %r" % (__name__, name))
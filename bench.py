@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+
+import argparse
+import itertools
+import json
+import math
+import platform
+import random
+import subprocess
+import time
+import tracemalloc
+
+from Verwischen import Config, Session, CallbackSink, VirtualClock
+
+
+# nominal value span of every generated QI, the EC count of a case is set through GENERALIZE_RANGE = SPAN / ecs
+SPAN = 100.0
+
+
+def _drift(r, i, qi):
+	# vitals slowly wandering over the whole span, with sensor noise
+	phase = i / 500.0 + qi
+	return SPAN / 2 + SPAN / 3 * math.sin(phase) + r.gauss(0, SPAN / 50)
+
+
+def _bimodal(r, i, qi):
+	# two operating points (e.g. rest / activity)
+	return r.choice((SPAN / 4, SPAN * 3 / 4)) + r.gauss(0, SPAN / 25)
+
+
+def _bursts(r, i, qi):
+	# steady readings, with bursts of rapidly changing values every few hundred tuples
+	if i % 400 < 40:
+		return r.uniform(0, SPAN)
+	return SPAN / 2 + r.gauss(0, SPAN / 30)
+
+
+def _outliers(r, i, qi):
+	# normal readings with 5% of values far outside the usual range
+	if r.random() < 0.05:
+		return r.uniform(-SPAN, 2 * SPAN)
+	return SPAN / 2 + r.gauss(0, SPAN / 10)
+
+
+GENERATORS = {
+	"drift": _drift,
+	"bimodal": _bimodal,
+	"bursts": _bursts,
+	"outliers": _outliers,
+}
+
+
+def generate(kind, n, config, seed=0):
+	'''
+	Synthesize n parsed sensor tuples of a distribution, laid out as the config expects (QI fields as float numbers)
+	'''
+
+	r = random.Random(seed)
+	value = GENERATORS[kind]
+	width = max(config.QI_POS + config.ID_POS) + 1
+
+	rows = []
+	for i in range(n):
+		row = []
+		for pos in range(width):
+			if pos in config.QI_POS:
+				row.append(value(r, i, pos))
+			else:
+				row.append("id%d" % (i % 97))
+		rows.append(row)
+	return rows
+
+
+def _percentile(ordered, p):
+	# nearest-rank percentile of a sorted list
+	return ordered[min(len(ordered) - 1, max(0, math.ceil(p / 100.0 * len(ordered)) - 1))]
+
+
+def run_case(kind, n, ecs, k, tolerance, seed=0):
+	'''
+	Feed n generated tuples through process() and measure throughput, per-tuple latency and peak memory
+	'''
+
+	config = Config()
+	config.QI_POS = [1, 2, 3]
+	config.ID_POS = [4]
+	config.GENERALIZE_RANGE = SPAN / ecs
+	config.THRESHOLD_K = k
+	config.ACCUMULATION_DELAY_TOLERANCE = tolerance
+
+	rows = generate(kind, n, config, seed)
+
+	def session():
+		# published records are dropped and time stands still, only the engine is measured
+		random.seed(seed)
+		return Session(config, CallbackSink(lambda record: None), VirtualClock())
+
+	# timed pass
+	s = session()
+	latencies = []
+	perf_counter = time.perf_counter
+	start = perf_counter()
+	for counter in range(n):
+		row = rows[counter]
+		t = perf_counter()
+		s.process(counter, row)
+		latencies.append(perf_counter() - t)
+	elapsed = perf_counter() - start
+	latencies.sort()
+
+	# memory pass (tracemalloc slows everything down, so it is not timed)
+	s = session()
+	tracemalloc.start()
+	for counter in range(n):
+		s.process(counter, rows[counter])
+	peak = tracemalloc.get_traced_memory()[1]
+	tracemalloc.stop()
+
+	return {
+		"kind": kind,
+		"tuples": n,
+		"ecs": ecs,
+		"k": k,
+		"tolerance": tolerance,
+		"tuples_per_sec": n / elapsed,
+		"p50_us": _percentile(latencies, 50) * 1e6,
+		"p99_us": _percentile(latencies, 99) * 1e6,
+		"p999_us": _percentile(latencies, 99.9) * 1e6,
+		"peak_memory_bytes": peak,
+	}
+
+
+def _revision():
+	try:
+		return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+	except (OSError, subprocess.CalledProcessError):
+		return None
+
+
+def _case_key(case):
+	return (case["kind"], case["tuples"], case["ecs"], case["k"], case["tolerance"])
+
+
+def compare(baseline, results):
+	'''
+	Print the change of every metric against the matching cases of a baseline result file
+	'''
+
+	old = {_case_key(case): case for case in baseline["cases"]}
+	for case in results["cases"]:
+		base = old.get(_case_key(case))
+		if base is None:
+			continue
+		changes = ["%s %+.1f%%" % (metric, (case[metric] / base[metric] - 1) * 100) for metric in ("tuples_per_sec", "p50_us", "p99_us", "p999_us", "peak_memory_bytes") if base[metric]]
+		print("%-8s ecs=%-4d k=%-3d tol=%-3d " % (case["kind"], case["ecs"], case["k"], case["tolerance"]), ", ".join(changes))
+
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Throughput / latency / memory benchmark of the anonymization engine")
+	parser.add_argument("--kinds", nargs="+", default=sorted(GENERATORS), choices=sorted(GENERATORS))
+	parser.add_argument("--tuples", type=int, default=20000)
+	parser.add_argument("--ecs", type=int, nargs="+", default=[20, 200], help="ECs spanning the value range of a QI")
+	parser.add_argument("--k", type=int, nargs="+", default=[5, 20])
+	parser.add_argument("--tolerance", type=int, nargs="+", default=[5, 50])
+	parser.add_argument("--seed", type=int, default=0)
+	parser.add_argument("--output", default="bench.json")
+	parser.add_argument("--compare", default=None, help="earlier result file to diff against")
+	args = parser.parse_args()
+
+	results = {
+		"revision": _revision(),
+		"python": platform.python_version(),
+		"cases": [],
+	}
+
+	for kind, ecs, k, tolerance in itertools.product(args.kinds, args.ecs, args.k, args.tolerance):
+		case = run_case(kind, args.tuples, ecs, k, tolerance, args.seed)
+		results["cases"].append(case)
+		print("%-8s ecs=%-4d k=%-3d tol=%-3d %10.0f tuples/s  p50 %7.1fus  p99 %7.1fus  p999 %8.1fus  peak %8.1fKiB" % (kind, ecs, k, tolerance, case["tuples_per_sec"], case["p50_us"], case["p99_us"], case["p999_us"], case["peak_memory_bytes"] / 1024))
+
+	with open(args.output, "w") as f:
+		json.dump(results, f, indent=1)
+
+	if args.compare is not None:
+		with open(args.compare) as f:
+			compare(json.load(f), results)
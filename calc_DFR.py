@@ -1,54 +1,93 @@
-
+import argparse
 import ast
-import configparser
 
+from Verwischen import RecordSchema, Sink, load_config, read_binary, read_jsonl
 
 
-if __name__ == "__main__":
+# clinical decision thresholds of the QIs, in QI_POS order: (name, thresholds)
+THRESHOLDS = [
+	("glucose", [70, 100, 125]),
+	("systolic", [90, 120, 140]),
+	("diastolic", [60, 90]),
+]
+
+
+
+class DFREvaluator(Sink):
 	'''
-	conf = configparser.ConfigParser()
-	conf.read('config.ini')
-
-	QI_POS = ast.literal_eval(conf['params']['QI_POS'])
-	# check if the interpreted data is a list
-		if not isinstance(QI_POS, list):
-			raise SyntaxError
-		for element in QI_POS:
-			if not isinstance(element, int):
-				raise SyntaxError
+	Streaming diagnosis failure rate: the share of published records whose generalized QI range straddles a clinical threshold
+	Usable as a Sink of the engine (inline, no intermediate files) or fed the records of an output file
 	'''
-	glucose = [70, 100, 125]
-	systolic = [90, 120, 140]
-	diastolic = [60, 90]
 
+	def __init__(self, config, thresholds=THRESHOLDS, index=None, id_pos=-1):
+		# QI positions in the published records
+		self.positions = [(name, pos, values) for pos, (name, values) in zip(RecordSchema(config).qi_out, thresholds)]
+
+		# record identifier -> number of dataset rows carrying it (None: every record counts once)
+		self.index = index
+		self.id_pos = id_pos
+
+		self.total = 0
+		self.failures = {name: 0 for name, pos, values in self.positions}
+
+	def write(self, record, delay=None, compromised=False, published=None):
+		self.total += 1
+
+		if self.index is None:
+			matches = 1
+		else:
+			matches = self.index.get(str(record[self.id_pos]).strip(), 0)
+			if not matches:
+				return
+
+		for name, pos, values in self.positions:
+			lb, ub = record[pos]
+			for threshold in values:
+				if lb < threshold < ub:
+					self.failures[name] += matches
+
+	def rates(self):
+		'''
+		Return the DFR of every QI
+		'''
+		return {name: fail / self.total if self.total else 0.0 for name, fail in self.failures.items()}
 
-	data = []
-	with open("dataset.csv") as f:
+
+def build_index(path, id_pos=-1):
+	'''
+	Count the rows of a dataset per record identifier
+	'''
+
+	index = {}
+	with open(path) as f:
 		for record in f:
-			data.append([x.strip() for x in record.split(',')])
-	
-	
-	fail_glucose = fail_systolic = fail_diastolic = 0
-	total_tuples = 0
-
-	with open("output_tuple.txt") as f:
-		for output in f:
-			lis = ast.literal_eval(output)
-			
-			total_tuples += 1
-
-			for record in data:
-				if lis[-1] == record[-1]:
-					for i in glucose:
-						if lis [1][0] < i < lis[1][1]:
-							fail_glucose += 1
-					for i in systolic:
-						if lis [1][0] < i < lis[1][1]:
-							fail_systolic += 1
-					for i in diastolic:
-						if lis [1][0] < i < lis[1][1]:
-							fail_diastolic += 1
-		
-		print("DFR_glucose: ", fail_glucose / total_tuples)
-		print("DFR_systolic: ", fail_systolic / total_tuples)
-		print("DFR_diastolic: ", fail_diastolic / total_tuples)
+			if not record.strip():
+				continue
+			key = record.split(',')[id_pos].strip()
+			index[key] = index.get(key, 0) + 1
+	return index
+
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Diagnosis failure rate of the published records")
+	parser.add_argument("--dataset", default="dataset.csv")
+	parser.add_argument("--output", default="output_tuple.txt")
+	parser.add_argument("--format", choices=["text", "jsonl", "binary"], default="text")
+	parser.add_argument("--config", default="config.ini")
+	args = parser.parse_args()
+
+	config = load_config(args.config)
+	evaluator = DFREvaluator(config, index=build_index(args.dataset))
+
+	if args.format == "text":
+		with open(args.output) as f:
+			for output in f:
+				evaluator.write(ast.literal_eval(output))
+	else:
+		schema = RecordSchema(config)
+		for record in (read_jsonl(args.output) if args.format == "jsonl" else read_binary(args.output)):
+			evaluator.write(schema.to_record(record))
+
+	for name, rate in evaluator.rates().items():
+		print("DFR_%s: " % name, rate)
@@ -1,15 +1,28 @@
+import argparse
+
+from Verwischen import read_binary, read_jsonl
 
 
 
 if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Average anonymization delay")
+	parser.add_argument("--input", default=None, help="default: output_delay.txt (text) or output_tuple.jsonl / output_tuple.bin")
+	parser.add_argument("--format", choices=["text", "jsonl", "binary"], default="text")
+	args = parser.parse_args()
+
+	if args.format == "text":
+		delays = (float(record) for record in open(args.input or "output_delay.txt"))
+	else:
+		records = read_jsonl(args.input or "output_tuple.jsonl") if args.format == "jsonl" else read_binary(args.input or "output_tuple.bin")
+		# delays are only known for the records published in EXPERIMENT_MODE
+		delays = (record["published"] - record["arrival"] for record in records if record["arrival"] is not None)
 
 	total_sum = 0
 	lines = 0
 
-	with open("output_delay.txt") as f:
-		for record in f:
-			total_sum += float(record)
-			lines += 1
-			print(total_sum)
+	for delay in delays:
+		total_sum += delay
+		lines += 1
+		print(total_sum)
 
 	print("Average delay time: ", total_sum / lines)
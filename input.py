@@ -7,6 +7,7 @@ if __name__ == "__main__":
 	open("output_tuple.txt", "w").close()
 	
 	setExperimentMode()
+	setSink(TeeSink(ConsoleSink(), BufferedFileSink("output_tuple.txt", "output_delay.txt")))
 	stream_input_file("dataset2.csv")
 
 
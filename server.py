@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+
+import argparse
+import asyncio
+import concurrent.futures
+
+from Verwischen import Config, SessionManager, load_config, parse_tuple
+
+
+class IngestionServer:
+	'''
+	Asyncio ingestion service: sensor clients send newline-delimited tuples over TCP or Unix sockets
+	Protocol (first line of a connection):
+		STREAM <stream_id>       every following line is a tuple of that stream
+		SUBSCRIBE [<stream_id>]  receive "<stream_id>\t<record>" lines of the published records (of one stream or all)
+		anything else            a tuple, the stream id is then the peer address (the stream ends with the connection)
+	'''
+
+	def __init__(self, config=None, max_pending=1024, batch_size=256):
+		self.config = config if config is not None else Config()
+		# the anonymizer runs in a single worker thread, so the event loop never blocks on it and each stream stays ordered
+		self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+		self.manager = SessionManager(self.config, self._collect)
+		# records published by the batch running in the worker thread
+		self.outbox = []
+
+		# parsed tuples waiting for the anonymizer. when full, client reads pause (TCP backpressure)
+		self.max_pending = max_pending
+		self.batch_size = batch_size
+		self.pending = None
+
+		# subscriber stream writer -> stream id filter (None: all streams)
+		self.subscribers = {}
+		# handler tasks of the connected sensor clients
+		self.clients = set()
+		self.servers = []
+		self.worker = None
+
+	def _collect(self, stream_id, record):
+		self.outbox.append((stream_id, record))
+
+	async def start(self, host=None, port=None, path=None):
+		'''
+		Listen on TCP (host, port) and/or a Unix socket path
+		'''
+		self.pending = asyncio.Queue(self.max_pending)
+		self.worker = asyncio.ensure_future(self._run())
+
+		if port is not None:
+			self.servers.append(await asyncio.start_server(self._handle_client, host, port))
+		if path is not None:
+			self.servers.append(await asyncio.start_unix_server(self._handle_client, path))
+
+	def sockets(self):
+		'''
+		Return the listening sockets (e.g. to learn an ephemeral port)
+		'''
+		return [sock for server in self.servers for sock in server.sockets]
+
+	async def _handle_client(self, reader, writer):
+		line = await reader.readline()
+		if not line:
+			writer.close()
+			return
+		line = line.decode().strip()
+
+		if line.startswith("SUBSCRIBE"):
+			words = line.split(None, 1)
+			self.subscribers[writer] = words[1] if len(words) > 1 else None
+			# keep the subscription until the client hangs up
+			await reader.read()
+			self.subscribers.pop(writer, None)
+			writer.close()
+			return
+
+		if line.startswith("STREAM "):
+			stream_id = line.split(None, 1)[1]
+			line = None
+			peer_keyed = False
+		else:
+			stream_id = str(writer.get_extra_info("peername") or writer.get_extra_info("sockname"))
+			peer_keyed = True
+
+		task = asyncio.current_task()
+		self.clients.add(task)
+		try:
+			if line:
+				await self.pending.put((stream_id, line))
+			async for line in reader:
+				line = line.decode().strip()
+				if line:
+					await self.pending.put((stream_id, line))
+		finally:
+			# a reconnecting client gets a new peer address: close the session once its queued tuples are processed
+			if peer_keyed:
+				await self.pending.put((stream_id, None))
+			self.clients.discard(task)
+			writer.close()
+
+	def _process_batch(self, batch):
+		# runs in the worker thread
+		for stream_id, line in batch:
+			# end of a stream keyed by peer address
+			if line is None:
+				if stream_id in self.manager:
+					self.manager.close(stream_id)
+				continue
+
+			try:
+				tup = parse_tuple(line, self.config.QI_POS)
+			except (ValueError, SyntaxError):
+				print("Syslog: Invalid input from stream ", stream_id, ": ", line)
+				continue
+
+			session = self.manager.session(stream_id)
+			session.process(session.tuple_counter, tup)
+
+		published, self.outbox = self.outbox, []
+		return published
+
+	async def _run(self):
+		loop = asyncio.get_running_loop()
+		while True:
+			# wait for one tuple, then take whatever else is already queued
+			batch = [await self.pending.get()]
+			while len(batch) < self.batch_size and not self.pending.empty():
+				batch.append(self.pending.get_nowait())
+
+			published = await loop.run_in_executor(self.executor, self._process_batch, batch)
+			await self._fan_out(published)
+
+			for i in range(len(batch)):
+				self.pending.task_done()
+
+	async def _fan_out(self, published):
+		if not published or not self.subscribers:
+			return
+
+		for writer, wanted in list(self.subscribers.items()):
+			try:
+				for stream_id, record in published:
+					if wanted is None or wanted == stream_id:
+						writer.write(("%s\t%s\n" % (stream_id, record)).encode())
+				# slow subscribers slow down ingestion rather than buffering without bound
+				await writer.drain()
+			except ConnectionError:
+				self.subscribers.pop(writer, None)
+
+	async def close(self):
+		'''
+		Stop listening, wait for the connected sensors to hang up, then publish everything queued or accumulated
+		'''
+		for server in self.servers:
+			server.close()
+
+		await asyncio.gather(*self.clients)
+		await self.pending.join()
+		self.worker.cancel()
+
+		loop = asyncio.get_running_loop()
+		await loop.run_in_executor(self.executor, self.manager.close_all)
+		published, self.outbox = self.outbox, []
+		await self._fan_out(published)
+
+		for writer in list(self.subscribers):
+			writer.close()
+		self.executor.shutdown()
+
+
+
+async def _open(host=None, port=None, path=None):
+	if path is not None:
+		return await asyncio.open_unix_connection(path)
+	return await asyncio.open_connection(host, port)
+
+
+async def send_tuples(lines, stream_id, host=None, port=None, path=None):
+	'''
+	Loopback client: send tuples of one stream to the ingestion service
+	'''
+	reader, writer = await _open(host, port, path)
+	writer.write(("STREAM %s\n" % stream_id).encode())
+	for line in lines:
+		writer.write((line.strip() + "\n").encode())
+		await writer.drain()
+	writer.close()
+	await writer.wait_closed()
+
+
+async def subscribe(host=None, port=None, path=None, stream_id=None):
+	'''
+	Loopback client: yield (stream_id, record string) for every record published by the service
+	'''
+	reader, writer = await _open(host, port, path)
+	writer.write(("SUBSCRIBE %s\n" % stream_id if stream_id is not None else "SUBSCRIBE\n").encode())
+	await writer.drain()
+	async for line in reader:
+		yield line.decode().rstrip("\n").split("\t", 1)
+
+
+
+async def _replay(filepath, streams):
+	# run the service on an ephemeral port and feed it the file through loopback clients
+	server = IngestionServer(load_config())
+	await server.start("127.0.0.1", 0)
+	port = server.sockets()[0].getsockname()[1]
+
+	async def receive():
+		async for stream_id, record in subscribe("127.0.0.1", port):
+			print("Transmitted : ", stream_id, record)
+
+	receiver = asyncio.ensure_future(receive())
+	# let the subscription register before the first tuple arrives
+	await asyncio.sleep(0.1)
+
+	with open(filepath) as f:
+		lines = [line for line in f if line.strip()]
+	await asyncio.gather(*[send_tuples(lines[i::streams], "sensor%d" % i, "127.0.0.1", port) for i in range(streams)])
+
+	await server.close()
+	await receiver
+
+
+async def _serve(host, port, path):
+	server = IngestionServer(load_config())
+	await server.start(host, port, path)
+	print("Syslog: Listening on ", server.sockets())
+	await asyncio.Event().wait()
+
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Asyncio ingestion service for sensor tuples")
+	parser.add_argument("--host", default="127.0.0.1")
+	parser.add_argument("--port", type=int, default=None)
+	parser.add_argument("--unix", default=None, help="Unix socket path")
+	parser.add_argument("--replay", default=None, help="feed an input file through loopback clients and print the published records")
+	parser.add_argument("--streams", type=int, default=4, help="loopback clients used by --replay")
+	args = parser.parse_args()
+
+	if args.replay is not None:
+		asyncio.run(_replay(args.replay, args.streams))
+	else:
+		port = args.port if args.port is not None or args.unix is not None else 8765
+		asyncio.run(_serve(args.host, port, args.unix))
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+
+import argparse
+import multiprocessing
+import os
+import queue
+import random
+import traceback
+import zlib
+
+from Verwischen import Config, SessionManager, load_config, parse_tuple
+
+
+def _shard_worker(config, inbox, outbox, shard):
+	'''
+	Worker process: runs the anonymizer sessions of every stream routed to this shard
+	Messages from the front-end are ("batch", [(stream_id, counter, tuple), ...]), ("refresh",) and ("close",)
+	'''
+
+	# forked workers must not share the padding randomness of the parent
+	random.seed()
+
+	# records published while handling the current message, in publication order
+	published = []
+
+	manager = SessionManager(config, lambda stream_id, record: published.append((stream_id, record)))
+
+	try:
+		while True:
+			msg = inbox.get()
+
+			if msg[0] == "batch":
+				for stream_id, counter, sensor_value in msg[1]:
+					manager.process(stream_id, counter, sensor_value)
+
+			elif msg[0] == "refresh":
+				# publish every accumulated tuple before wiping the ECs
+				manager.refresh()
+
+			elif msg[0] == "close":
+				# drain all sessions, nothing accumulated is left behind
+				manager.close_all()
+				outbox.put(("closed", shard, published))
+				return
+
+			if published:
+				outbox.put(("published", shard, published))
+				published = []
+
+	except Exception:
+		outbox.put(("error", shard, traceback.format_exc()))
+
+
+
+class ShardedIngestor:
+	'''
+	Distribute the streams over a pool of worker processes (one anonymizer state per worker)
+	A stream always goes to the same worker, so its records are published in stream order
+	'''
+
+	def __init__(self, config=None, workers=None, batch_size=256):
+		self.config = config if config is not None else Config()
+		self.workers = workers if workers is not None else os.cpu_count()
+		# tuples per IPC message
+		self.batch_size = batch_size
+
+		# per-stream tuple counter
+		self.counters = {}
+		# tuples waiting to be sent, one batch per worker
+		self.buffers = [[] for i in range(self.workers)]
+
+		self.outbox = multiprocessing.Queue()
+		self.inboxes = []
+		self.procs = []
+		for shard in range(self.workers):
+			inbox = multiprocessing.Queue()
+			proc = multiprocessing.Process(target=_shard_worker, args=(self.config, inbox, self.outbox, shard), daemon=True)
+			proc.start()
+			self.inboxes.append(inbox)
+			self.procs.append(proc)
+
+		# published (stream_id, record) received from the workers and not yet handed out
+		self.ready = []
+		self.closed = False
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc):
+		if not self.closed:
+			self.close()
+
+	def route(self, stream_id):
+		'''
+		Return the worker serving a stream (stable across processes and runs)
+		'''
+		return zlib.crc32(str(stream_id).encode()) % self.workers
+
+	def submit(self, stream_id, sensor_value):
+		'''
+		Queue a parsed tuple of a stream for anonymization
+		'''
+		counter = self.counters.get(stream_id, 0)
+		self.counters[stream_id] = counter + 1
+
+		shard = self.route(stream_id)
+		buffer = self.buffers[shard]
+		buffer.append((stream_id, counter, sensor_value))
+		if len(buffer) >= self.batch_size:
+			self._send(shard)
+
+	def submit_line(self, stream_id, sensor_tuple):
+		'''
+		Queue a raw input line of a stream for anonymization
+		'''
+		try:
+			self.submit(stream_id, parse_tuple(sensor_tuple, self.config.QI_POS))
+		except (ValueError, SyntaxError):
+			raise Exception("Error: Invalid input information detected.")
+
+	def _send(self, shard):
+		if self.buffers[shard]:
+			self.inboxes[shard].put(("batch", self.buffers[shard]))
+			self.buffers[shard] = []
+
+	def flush(self):
+		'''
+		Send every partially filled batch to its worker
+		'''
+		for shard in range(self.workers):
+			self._send(shard)
+
+	def _receive(self, block):
+		msg = self.outbox.get(block)
+		if msg[0] == "error":
+			raise Exception("Error: shard worker %d failed.\n%s" % (msg[1], msg[2]))
+		self.ready.extend(msg[2])
+		return msg
+
+	def results(self):
+		'''
+		Return the records published so far as (stream_id, record), in per-stream order
+		'''
+		try:
+			while True:
+				self._receive(False)
+		except queue.Empty:
+			pass
+
+		ready, self.ready = self.ready, []
+		return ready
+
+	def refresh(self):
+		'''
+		Publish all accumulated tuples and wipe the ECs on every worker
+		'''
+		self.flush()
+		for inbox in self.inboxes:
+			inbox.put(("refresh",))
+
+	def close(self):
+		'''
+		Drain every worker and stop the pool, returning the records not handed out yet
+		'''
+		self.flush()
+		for inbox in self.inboxes:
+			inbox.put(("close",))
+
+		# wait until every worker has published its accumulated tuples
+		closed = 0
+		while closed < self.workers:
+			if self._receive(True)[0] == "closed":
+				closed += 1
+
+		for proc in self.procs:
+			proc.join()
+		self.closed = True
+
+		ready, self.ready = self.ready, []
+		return ready
+
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Anonymize a multi-stream input file on a pool of worker processes")
+	parser.add_argument("filepath")
+	parser.add_argument("--workers", type=int, default=os.cpu_count())
+	parser.add_argument("--batch-size", type=int, default=256)
+	parser.add_argument("--stream-pos", type=int, default=None, help="position of the stream id in the inputs (default: first ID_POS)")
+	args = parser.parse_args()
+
+	config = load_config()
+	stream_pos = args.stream_pos if args.stream_pos is not None else config.ID_POS[0]
+
+	with ShardedIngestor(config, args.workers, args.batch_size) as ingestor:
+		with open(args.filepath) as f:
+			for sensor_tuple in f:
+				if not sensor_tuple.strip():
+					continue
+				ingestor.submit_line(sensor_tuple.split(',')[stream_pos].strip(), sensor_tuple)
+				for stream_id, record in ingestor.results():
+					print("Transmitted : ", stream_id, record)
+
+		for stream_id, record in ingestor.close():
+			print("Transmitted : ", stream_id, record)
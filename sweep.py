@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+
+import argparse
+import contextlib
+import copy
+import itertools
+import json
+import multiprocessing
+import os
+import random
+import time
+
+from Verwischen import Metrics, Session, Sink, TeeSink, VirtualClock, load_config, read_tuples
+from bench import GENERATORS, _percentile, generate
+from calc_DFR import DFREvaluator
+
+
+# swept parameter -> Config attribute
+PARAMS = {
+	"k": "THRESHOLD_K",
+	"range": "GENERALIZE_RANGE",
+	"tolerance": "ACCUMULATION_DELAY_TOLERANCE",
+	"max_members": "EC_MAX_HOLDING_MEMBERS",
+}
+
+
+class DelayStats(Sink):
+	'''
+	Anonymization delays and compromised publications of the records published in EXPERIMENT_MODE
+	'''
+
+	def __init__(self):
+		self.delays = []
+		self.compromised = 0
+
+	def write(self, record, delay=None, compromised=False, published=None):
+		self.delays.append(delay)
+		if compromised:
+			self.compromised += 1
+
+
+
+# parsed tuples of the dataset, loaded once per worker process
+_rows = None
+
+
+def _load(dataset, kind, tuples, config, timestamp_pos, seed):
+	global _rows
+	if dataset is not None:
+		_rows = [tup for line_numbers, rows in read_tuples(dataset, config, timestamp_pos=timestamp_pos, on_error=lambda *error: None) for tup in rows]
+	else:
+		_rows = generate(kind, tuples, config, seed)
+
+
+def run_config(config, interval, timestamp_pos=None, seed=0):
+	'''
+	Replay the dataset of the worker through a fresh session of a configuration (virtual time, tuples interval seconds apart
+	or as recorded in the timestamp_pos column) and measure throughput, delays, compromise rate and DFR
+	'''
+
+	random.seed(seed)
+	clock = VirtualClock()
+	metrics = Metrics()
+	stats = DelayStats()
+	dfr = DFREvaluator(config)
+
+	session = Session(config, TeeSink(stats, dfr), clock, metrics)
+	session.setExperimentMode()
+
+	# EXPERIMENT_MODE also prints the engine's debug traces, which are of no use here
+	with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+		start = time.perf_counter()
+		for counter, row in enumerate(_rows):
+			if timestamp_pos is not None:
+				session.advance_clock(row[timestamp_pos])
+			elif counter:
+				clock.sleep(interval)
+
+			# EXPERIMENT_MODE expects the arrival time attached to the tuple
+			tup = list(row)
+			tup.append(clock.time())
+			session.process(counter, tup)
+		session.drain()
+		elapsed = time.perf_counter() - start
+
+	delays = sorted(stats.delays)
+	counters = metrics.snapshot()["counters"]
+	result = {name: getattr(config, attr) for name, attr in PARAMS.items()}
+	result.update({
+		"tuples": len(_rows),
+		"tuples_per_sec": len(_rows) / elapsed if elapsed else 0.0,
+		"mean_delay": sum(delays) / len(delays) if delays else 0.0,
+		"p99_delay": _percentile(delays, 99) if delays else 0.0,
+		"compromise_rate": stats.compromised / len(delays) if delays else 0.0,
+		"refreshes": counters.get("refreshes", 0),
+		"dfr": dfr.rates(),
+	})
+	return result
+
+
+def grid(config, values):
+	'''
+	Yield a copy of the config for every combination of the swept values (parameter -> list of values)
+	'''
+
+	names = list(values)
+	for combination in itertools.product(*(values[name] for name in names)):
+		conf = copy.copy(config)
+		for name, value in zip(names, combination):
+			setattr(conf, PARAMS[name], value)
+		yield conf
+
+
+def _run(task):
+	return run_config(*task)
+
+
+def sweep(config, values, dataset=None, kind="drift", tuples=20000, interval=None, timestamp_pos=None, workers=None, seed=0):
+	'''
+	Run every configuration of the grid on a process pool, each worker replaying its own copy of the dataset
+	(a file, or tuples synthesized by a bench generator), and return the results in grid order
+	'''
+
+	if interval is None:
+		interval = config.SENSOR_FREQUENCY
+
+	tasks = [(conf, interval, timestamp_pos, seed) for conf in grid(config, values)]
+	with multiprocessing.Pool(workers, _load, (dataset, kind, tuples, config, timestamp_pos, seed)) as pool:
+		return pool.map(_run, tasks, chunksize=1)
+
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Replay a dataset through a grid of configurations and tabulate the privacy / latency trade-off")
+	parser.add_argument("--dataset", default=None, help="input file (default: tuples synthesized by a bench generator)")
+	parser.add_argument("--kind", default="drift", choices=sorted(GENERATORS), help="bench generator used without --dataset")
+	parser.add_argument("--tuples", type=int, default=20000, help="tuples synthesized without --dataset")
+	parser.add_argument("--config", default="config.ini", help="base configuration, swept parameters aside")
+	parser.add_argument("--k", type=int, nargs="+", default=None)
+	parser.add_argument("--range", type=float, nargs="+", default=None, help="GENERALIZE_RANGE values")
+	parser.add_argument("--tolerance", type=int, nargs="+", default=None, help="ACCUMULATION_DELAY_TOLERANCE values")
+	parser.add_argument("--max-members", type=int, nargs="+", default=None, help="EC_MAX_HOLDING_MEMBERS values")
+	parser.add_argument("--interval", type=float, default=None, help="seconds between tuples (default: SENSOR_FREQUENCY)")
+	parser.add_argument("--timestamp-pos", type=int, default=None, help="position of the arrival time (seconds) in the inputs")
+	parser.add_argument("--workers", type=int, default=os.cpu_count())
+	parser.add_argument("--seed", type=int, default=0)
+	parser.add_argument("--output", default="sweep.json")
+	args = parser.parse_args()
+
+	config = load_config(args.config)
+	# parameters not swept keep the value of the base configuration
+	values = {name: getattr(args, name) or [getattr(config, attr)] for name, attr in PARAMS.items()}
+
+	results = sweep(config, values, args.dataset, args.kind, args.tuples, args.interval, args.timestamp_pos, args.workers, args.seed)
+
+	print("%5s %8s %5s %6s %12s %10s %10s %7s  %s" % ("k", "range", "tol", "max", "tuples/s", "mean_dly", "p99_dly", "comp%", "DFR"))
+	for result in results:
+		rates = " ".join("%s=%.3f" % (name, rate) for name, rate in result["dfr"].items())
+		print("%5d %8g %5d %6d %12.0f %10.2f %10.2f %7.2f  %s" % (result["k"], result["range"], result["tolerance"], result["max_members"], result["tuples_per_sec"], result["mean_delay"], result["p99_delay"], result["compromise_rate"] * 100, rates))
+
+	with open(args.output, "w") as f:
+		json.dump(results, f, indent=1)
@@ -0,0 +1,49 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Verwischen import CallbackSink, Config, Session, VirtualClock
+
+
+def _config():
+	config = Config()
+	config.QI_POS = [1]
+	config.ID_POS = [2]
+	config.THRESHOLD_K = 3
+	return config
+
+
+def test_repeated_counter():
+	out = []
+	session = Session(_config(), CallbackSink(out.append), VirtualClock())
+	# the counters are the caller's: nothing requires them to be unique
+	for i in range(3):
+		session.process(0, [i, 5.0, "x"])
+
+	assert sorted(record[0] for record in out) == [0, 1, 2]
+	assert len(session.Accumulated_list) == 0
+
+
+def test_restore_during_rolling_refresh(tmp_path):
+	path = str(tmp_path / "state.ckpt")
+	config = _config()
+	config.REFRESH_WARMUP = 4
+	config.EC_MAX_HOLDING_MEMBERS = 6
+
+	out = []
+	session = Session(config, CallbackSink(out.append), VirtualClock())
+	restored = None
+	for i in range(40):
+		# during the warm-up, a value far from the others is accumulated
+		value = 500.0 if restored is None and session.Shadow is not None else 48.0 + i % 4 * 10
+		session.process(i, [i, value, "x"])
+		if restored is None and session.Shadow is not None and session.Shadow[2]:
+			session.checkpoint(path)
+			restored = Session(config, CallbackSink(out.append), VirtualClock())
+			assert restored.restore(path)
+			session = restored
+	session.drain()
+
+	assert restored is not None
+	assert sorted(record[0] for record in out) == list(range(40))
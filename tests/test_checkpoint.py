@@ -0,0 +1,58 @@
+import os
+import sys
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Verwischen import CallbackSink, Config, Session, SessionManager, VirtualClock
+
+
+def _config():
+	config = Config()
+	config.QI_POS = [1, 2]
+	config.ID_POS = [3]
+	return config
+
+
+def _restored(path):
+	session = Session(_config(), CallbackSink(lambda record: None), VirtualClock())
+	assert session.restore(path)
+	return session.tuple_counter
+
+
+def test_periodic_checkpoint_resumes_after_last_tuple(tmp_path):
+	path = str(tmp_path / "state.ckpt")
+
+	# stream_input(): a snapshot after every tuple
+	session = Session(_config(), CallbackSink(lambda record: None), VirtualClock())
+	session.setCheckpoint(path, 0)
+	for i in range(100):
+		session.stream_input("%d, %d, %d, id%d" % (i, i % 7, i % 11, i), timestamp=i)
+	assert _restored(path) == 100
+
+	# process_batch(): the counter advances row by row
+	session = Session(_config(), CallbackSink(lambda record: None), VirtualClock())
+	session.setCheckpoint(path, 0)
+	session.process_batch([[i, float(i % 7), float(i % 11), "id%d" % i] for i in range(100)])
+	assert session.tuple_counter == 100
+	assert _restored(path) == 100
+
+
+def test_manager_checkpoint_holds_session_lock(tmp_path):
+	path = str(tmp_path / "state.ckpt")
+	manager = SessionManager(_config(), clock=VirtualClock())
+	session = manager.session("a")
+	for i in range(10):
+		session.stream_input("%d, %d, %d, id%d" % (i, i % 7, i % 11, i), timestamp=i)
+
+	# the snapshot waits while another thread (the DeadlineScheduler) works on the session
+	with session.lock:
+		writer = threading.Thread(target=manager.checkpoint, args=(path,))
+		writer.start()
+		writer.join(0.2)
+		assert writer.is_alive()
+	writer.join()
+
+	restored = SessionManager(_config(), clock=VirtualClock())
+	assert restored.restore(path)
+	assert restored.session("a").tuple_counter == 10
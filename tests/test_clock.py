@@ -0,0 +1,26 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Verwischen import CallbackSink, Config, Metrics, Session, VirtualClock
+
+
+def test_timestamps_do_not_expire_refresh_timer():
+	config = Config()
+	config.QI_POS = [1, 2]
+	config.ID_POS = [3]
+	config.THRESHOLD_K = 2
+
+	metrics = Metrics()
+	session = Session(config, CallbackSink(lambda record: None), VirtualClock(), metrics)
+
+	# epoch timestamps on a VirtualClock starting at 0
+	t0 = 1589761561.0
+	for i in range(5):
+		session.stream_input("a, %d, %d, id" % (i, i), timestamp=t0 + i)
+
+	counters = metrics.snapshot()["counters"]
+	assert counters.get("refreshes", 0) == 0
+	assert counters.get("published_compromised", 0) == 0
+	assert session.Init_timer == t0
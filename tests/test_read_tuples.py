@@ -0,0 +1,37 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Verwischen import CallbackSink, Config, Session, VirtualClock, parse_tuple, read_tuples
+
+
+def _config():
+	config = Config()
+	config.QI_POS = [1]
+	config.ID_POS = [2]
+	config.THRESHOLD_K = 1
+	return config
+
+
+def test_fields_stripped_as_parse_tuple(tmp_path):
+	lines = ["0, 5.5, id0, s  \n", "1 ,6.5 , id1 ,t\n"]
+	path = tmp_path / "input.csv"
+	path.write_text("".join(lines))
+
+	rows = [tup for line_numbers, chunk in read_tuples(str(path), _config()) for tup in chunk]
+	assert rows == [parse_tuple(line, [1]) for line in lines]
+
+
+def test_process_file_experiment_mode(tmp_path):
+	path = tmp_path / "input.csv"
+	path.write_text("".join("%d, 5.0, id%d, s%d\n" % (i, i, i) for i in range(10)))
+
+	out = []
+	session = Session(_config(), CallbackSink(out.append), VirtualClock())
+	session.setExperimentMode()
+	session.process_file(str(path))
+	session.drain()
+
+	# the arrival attached per row is removed again on publication, the last field survives
+	assert sorted(record[-1] for record in out) == ["s%d" % i for i in range(10)]
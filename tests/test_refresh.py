@@ -0,0 +1,32 @@
+import collections
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Verwischen import CallbackSink, Config, Session, VirtualClock
+
+
+def test_rolling_refresh_keeps_k_and_member_cap():
+	random.seed(0)
+	config = Config()
+	config.QI_POS = [1]
+	config.ID_POS = [2]
+	config.THRESHOLD_K = 3
+	config.REFRESH_WARMUP = 4
+	config.EC_MAX_HOLDING_MEMBERS = 6
+
+	out = []
+	session = Session(config, CallbackSink(out.append), VirtualClock())
+	peak = 0
+	for counter in range(40):
+		session.process(counter, [0, 48.0, "x"])
+		peak = max(peak, max(session.EC_list[1].member, default=0))
+	session.drain()
+
+	# no EC holds more than a wipe would allow
+	assert peak <= config.EC_MAX_HOLDING_MEMBERS + 1
+	# every published range is shared by at least K records
+	published = collections.Counter(tuple(record[1]) for record in out)
+	assert min(published.values()) >= config.THRESHOLD_K
@@ -0,0 +1,20 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Verwischen import Config, RecordSchema
+
+
+def test_named_columns_beyond_configured_positions():
+	config = Config()
+	config.COLUMNS = ["timestamp", "glucose", "systolic", "patient", "record_id"]
+	config.QI_POS = [1, 2]
+	config.ID_POS = [3]
+
+	schema = RecordSchema(config)
+	record = schema.project([10.0, 90.0, 120.0, "p1", "r7"], [[85, 95], [115, 125]])
+
+	assert record == [10.0, [85, 95], [115, 125], "r7"]
+	assert schema.position("record_id") == 3
+	assert schema.to_named(record) == {"timestamp": 10.0, "glucose": [85, 95], "systolic": [115, 125], "record_id": "r7"}
@@ -0,0 +1,51 @@
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Verwischen import Config
+from server import IngestionServer, subscribe
+
+
+def test_peer_keyed_stream_closed_on_disconnect():
+	config = Config()
+	config.QI_POS = [1]
+	config.ID_POS = [2]
+	config.THRESHOLD_K = 5
+
+	async def run():
+		server = IngestionServer(config)
+		await server.start("127.0.0.1", 0)
+		port = server.sockets()[0].getsockname()[1]
+
+		received = []
+
+		async def receive():
+			async for stream_id, record in subscribe("127.0.0.1", port):
+				received.append(record)
+
+		receiver = asyncio.ensure_future(receive())
+		await asyncio.sleep(0.1)
+
+		# no STREAM line: every connection is a stream of its own, too short to reach K
+		for connection in range(3):
+			reader, writer = await asyncio.open_connection("127.0.0.1", port)
+			for i in range(2):
+				writer.write(("%d, 5.0, id%d\n" % (i, i)).encode())
+			writer.close()
+			await writer.wait_closed()
+
+		# the accumulated tuples are published when the connections end, the sessions are gone
+		for i in range(500):
+			if len(received) == 6 and not server.clients:
+				break
+			await asyncio.sleep(0.01)
+		await server.pending.join()
+		assert len(received) == 6
+		assert len(server.manager) == 0
+
+		await server.close()
+		await receiver
+
+	asyncio.run(run())
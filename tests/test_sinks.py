@@ -0,0 +1,44 @@
+import os
+import sys
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Verwischen import BufferedFileSink
+
+
+class _InterleavingFile:
+	'''
+	File whose first writelines() lets another thread write to the sink in the middle of the flush (as the DeadlineScheduler may)
+	'''
+
+	def __init__(self, file, sink):
+		self.file = file
+		self.sink = sink
+		self.writer = None
+
+	def writelines(self, lines):
+		self.file.writelines(lines)
+		if self.writer is None:
+			self.writer = threading.Thread(target=self.sink.write, args=(["late"],))
+			self.writer.start()
+			# the writer is blocked while the sink is locked
+			self.writer.join(0.2)
+
+	def __getattr__(self, name):
+		return getattr(self.file, name)
+
+
+def test_buffered_file_sink_write_during_flush(tmp_path):
+	path = str(tmp_path / "out.txt")
+	sink = BufferedFileSink(path, flush_size=10 ** 6, flush_interval=10 ** 6)
+	sink.file = _InterleavingFile(sink.file, sink)
+
+	for i in range(5):
+		sink.write([i])
+	sink.flush()
+	sink.file.writer.join()
+	sink.close()
+
+	with open(path) as f:
+		assert f.read().splitlines() == ["[0]", "[1]", "[2]", "[3]", "[4]", "['late']"]